@@ -0,0 +1,80 @@
+import os
+import collections
+
+# Fallback origin used when an image carries no georeferencing
+BASE_LAT = 34.0522
+BASE_LNG = -118.2437
+
+
+def make_annotation(idx, box, score, cid, segmentation, names, transform, scaling_factor):
+    """Build one annotation entry in the _annotations.json schema."""
+    width = box[2] - box[0]
+    height = box[3] - box[1]
+    area_pixels = width * height
+    area_meters = area_pixels * scaling_factor * scaling_factor
+    center_x = (box[0] + box[2]) / 2
+    center_y = (box[1] + box[3]) / 2
+
+    if transform:
+        lng, lat = transform * (center_x, center_y)
+    else:
+        offset = idx * 0.001
+        lat = BASE_LAT + offset
+        lng = BASE_LNG + offset
+
+    return {
+        "id": idx,
+        "category_id": cid,
+        "class": names[cid],
+        "score": float(score),
+        "box": [float(x) for x in box],
+        "segmentation": segmentation,
+        "area": float(area_meters),
+        "location": {"lat": float(lat), "lng": float(lng)}
+    }
+
+
+def annotations_from_result(r, names, transform, scaling_factor):
+    """Convert an ultralytics Results object into annotation entries."""
+    boxes = r.boxes.xyxy.tolist()
+    scores = r.boxes.conf.tolist()
+    class_ids = [int(c) for c in r.boxes.cls.tolist()]
+    segs = r.masks.xy if (hasattr(r, "masks") and r.masks is not None) else []
+
+    annotations = []
+    for idx, (box, score, cid) in enumerate(zip(boxes, scores, class_ids)):
+        segmentation = [segs[idx].flatten().tolist()] if idx < len(segs) else []
+        annotations.append(make_annotation(idx, box, score, cid, segmentation, names, transform, scaling_factor))
+    return annotations
+
+
+def build_meta(image_path, width, height, names, annotations, scaling_factor):
+    """Assemble the top-level _annotations.json document."""
+    return {
+        "image": os.path.basename(image_path),
+        "width": int(width),
+        "height": int(height),
+        "categories": [{"id": i, "name": n} for i, n in names.items()],
+        "annotations": annotations,
+        "scaling_factor": float(scaling_factor)
+    }
+
+
+def summarize_annotations(annotations):
+    """Denormalised per-image summary stored next to the annotations at ingest time."""
+    scores = [float(ann["score"]) for ann in annotations if "score" in ann]
+    class_counts = {}
+    for ann in annotations:
+        name = ann.get("class", str(ann.get("category_id")))
+        class_counts[name] = class_counts.get(name, 0) + 1
+    return {
+        "detection_count": len(annotations),
+        "mean_confidence": sum(scores) / len(scores) if scores else 0,
+        "max_confidence": max(scores) if scores else 0,
+        "class_counts": class_counts,
+        "total_area": float(sum(ann.get("area", 0) for ann in annotations))
+    }
+
+
+# What process_image hands to save_to_db; out_json is None when sidecars are disabled
+ProcessResult = collections.namedtuple('ProcessResult', ['meta', 'out_json', 'out_img', 'original_path'])
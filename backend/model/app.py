@@ -3,19 +3,40 @@ import json
 import time
 import threading
 import shutil
-import requests
-import urllib.parse
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
-from flask_httpauth import HTTPBasicAuth
-from ultralytics import YOLO
+from werkzeug.utils import safe_join
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 import cv2
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure
 from bson.objectid import ObjectId
 import datetime
 import rasterio
 from rasterio.errors import RasterioIOError
 import logging
+import base64
+from inference_engine import InferenceEngine
+from inference_pool import PoolClient
+from model_backends import load_model
+from annotations import annotations_from_result, build_meta, summarize_annotations, ProcessResult
+from tiling import should_tile, tiled_predict, render_annotations_overview
+from ingest_pipeline import IngestPipeline
+from dedup import DedupIndex, content_hash, link_or_copy, settings_fingerprint
+from auth_cache import CredentialCache
+from sidecar import SidecarWriter
+from artefacts import send_artefact, IMMUTABLE, REVALIDATE
+from seg_codec import encode_meta, polygon_meta
+from overlay_renderer import render_overlay, save_image
+from derivatives import DerivativeStore
+from broker import EventBroker
+from session_manager import SessionManager
+from job_queue import JobQueue, job_status
+from bulk_upload import iter_entries, unique_name, save_stream
 
 # Flask app setup
 app = Flask(__name__)
@@ -28,27 +49,92 @@ CORS(app, resources={
         "allow_headers": ["*"]
     }
 })
-auth = HTTPBasicAuth()
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth(scheme='Bearer')
+# Routes accept either Basic credentials or a signed bearer token
+auth = MultiAuth(basic_auth, token_auth)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_DIR = 'outputs'
 IMAGES_FOLDER = 'images'
 REALTIME_OUTPUT_DIR = 'Real-time-outputs'
+DERIVATIVES_DIR = 'derivatives'
 WEIGHTS = "best_landfill_seg.pt"
 CONF_THRESH = 0.25
 IOU_THRESH = 0.45
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'tif', 'tiff'}
 IMAGE_SERVER_URL = 'http://localhost:8000/images'
+# Micro-batching for the shared inference engine
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', 10))
+# Inference runtime: 'torch', 'onnx' or 'openvino' (see export_model.py), at 'fp32' or 'int8'
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+INFERENCE_PRECISION = os.getenv('INFERENCE_PRECISION', 'fp32')
+INFERENCE_AUTO_EXPORT = os.getenv('INFERENCE_AUTO_EXPORT', '0') == '1'
+# Background processing of /upload: worker threads per process, retries and lease length
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+# /upload/bulk: images per job (one bulk write each) and images in flight per job
+BULK_JOB_SIZE = int(os.getenv('BULK_JOB_SIZE', 64))
+BULK_PROCESS_THREADS = int(os.getenv('BULK_PROCESS_THREADS', BATCH_MAX_SIZE))
+# Optional out-of-process inference pool (inference_pool.py); empty runs the model in each web worker
+INFERENCE_POOL_ADDRESS = os.getenv('INFERENCE_POOL_ADDRESS', '')
+INFERENCE_POOL_AUTHKEY = os.getenv('INFERENCE_POOL_AUTHKEY', '')
+# Batches kept in flight on the pool; match the pool's INFERENCE_POOL_WORKERS
+INFERENCE_POOL_WORKERS = int(os.getenv('INFERENCE_POOL_WORKERS', 0)) or os.cpu_count() or 1
+INFERENCE_POOL_TIMEOUT = float(os.getenv('INFERENCE_POOL_TIMEOUT', 120))
+# Windowed inference for GeoTIFFs larger than one tile
+TILED_INFERENCE = os.getenv('TILED_INFERENCE', '1') == '1'
+TILE_SIZE = int(os.getenv('TILE_SIZE', 1024))
+TILE_OVERLAP = int(os.getenv('TILE_OVERLAP', 128))
+TILE_BATCH = int(os.getenv('TILE_BATCH', 4))
+# Real-time ingestion pipeline sizing
+INGEST_DOWNLOADERS = int(os.getenv('INGEST_DOWNLOADERS', 4))
+INGEST_INFERENCE_WORKERS = int(os.getenv('INGEST_INFERENCE_WORKERS', 2))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 16))
+INGEST_POLL_INTERVAL = float(os.getenv('INGEST_POLL_INTERVAL', 5))
+# Reuse results for byte-identical images, whatever their filename
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', '1') == '1'
+# Auth: cached credential checks and signed bearer tokens
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 300))
+TOKEN_TTL = int(os.getenv('TOKEN_TTL', 3600))
+SECRET_KEY = os.getenv('SECRET_KEY')
+# _annotations.json sidecars: 'compact' (written in the background) or 'off' when MongoDB is the source of truth
+ANNOTATION_SIDECAR = os.getenv('ANNOTATION_SIDECAR', 'compact')
+ANNOTATION_SIDECAR_GZIP = os.getenv('ANNOTATION_SIDECAR_GZIP', '0') == '1'
+ANNOTATION_SIDECAR_BROTLI = os.getenv('ANNOTATION_SIDECAR_BROTLI', '0') == '1'
+# Stored segmentation format: 'polygon', 'simplified', 'int' or 'rle' (see seg_codec.py)
+SEGMENTATION_ENCODING = os.getenv('SEGMENTATION_ENCODING', 'polygon')
+SEGMENTATION_TOLERANCE = float(os.getenv('SEGMENTATION_TOLERANCE', 1.0))
+# Annotated images: 'jpg' (fastest to encode), 'webp' (smallest) or 'png', quality, and whether to render on first request
+ANNOTATED_FORMAT = os.getenv('ANNOTATED_FORMAT', 'jpg')
+ANNOTATED_QUALITY = int(os.getenv('ANNOTATED_QUALITY', 85))
+ANNOTATED_LAZY = os.getenv('ANNOTATED_LAZY', '0') == '1'
+# Cached thumbnails and XYZ tiles; images whose long side exceeds TILE_PYRAMID_MIN_SIZE advertise tiles
+THUMBNAIL_SIZES = tuple(int(s) for s in os.getenv('THUMBNAIL_SIZES', '128,256,512,1024').split(','))
+PYRAMID_TILE_SIZE = int(os.getenv('PYRAMID_TILE_SIZE', 256))
+TILE_PYRAMID_MIN_SIZE = int(os.getenv('TILE_PYRAMID_MIN_SIZE', 2048))
+# Cache-Control for processing outputs; set to 'no-cache' if outputs can be regenerated in place
+ARTEFACT_CACHE_CONTROL = os.getenv('ARTEFACT_CACHE_CONTROL', IMMUTABLE)
+# Real-time fan-out: replay ring size and per-subscriber buffer
+STREAM_REPLAY_EVENTS = int(os.getenv('STREAM_REPLAY_EVENTS', 256))
+STREAM_SUBSCRIBER_BUFFER = int(os.getenv('STREAM_SUBSCRIBER_BUFFER', 64))
 
 # Add to app.config
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_DIR'] = OUTPUT_DIR
 app.config['IMAGES_FOLDER'] = IMAGES_FOLDER
 app.config['REALTIME_OUTPUT_DIR'] = REALTIME_OUTPUT_DIR
+if not SECRET_KEY:
+    # Tokens then only validate in this process; set SECRET_KEY when running several workers
+    app.logger.warning("SECRET_KEY is not set; using a random key for bearer tokens")
+    SECRET_KEY = os.urandom(32).hex()
+app.config['SECRET_KEY'] = SECRET_KEY
 
 # Ensure directories exist
-for folder in [UPLOAD_FOLDER, OUTPUT_DIR, IMAGES_FOLDER, REALTIME_OUTPUT_DIR]:
+for folder in [UPLOAD_FOLDER, OUTPUT_DIR, IMAGES_FOLDER, REALTIME_OUTPUT_DIR, DERIVATIVES_DIR]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
@@ -58,14 +144,84 @@ db = client['landfill_detection']
 users_collection = db['users']
 images_collection = db['images']
 realtime_images_collection = db['realtime_images']
-
-# Load YOLO model
-model = YOLO(WEIGHTS)
-
-fetching_thread = None
-stop_fetching = threading.Event()
-current_api_key = None
-realtime_sessions = {}
+ingest_cursors_collection = db['ingest_cursors']
+# Cached results are only reused while the model and everything that shapes its output are unchanged
+dedup_index = DedupIndex(db['content_index'], fingerprint=settings_fingerprint(
+    WEIGHTS,
+    backend=INFERENCE_BACKEND,
+    precision=INFERENCE_PRECISION,
+    conf=CONF_THRESH,
+    iou=IOU_THRESH,
+    tiled=TILED_INFERENCE,
+    tile_size=TILE_SIZE,
+    tile_overlap=TILE_OVERLAP,
+    segmentation=SEGMENTATION_ENCODING,
+    tolerance=SEGMENTATION_TOLERANCE
+))
+
+
+def ensure_indexes():
+    """Create the indexes used by listing, real-time and auth queries."""
+    for collection in (images_collection, realtime_images_collection):
+        # Per-user listings sorted newest first; the trailing fields let listings run as covered queries
+        collection.create_index([
+            ("user_email", ASCENDING),
+            ("processed_at", DESCENDING),
+            ("_id", DESCENDING),
+            ("filename", ASCENDING),
+            ("summary.detection_count", ASCENDING),
+            ("summary.mean_confidence", ASCENDING)
+        ])
+        # Per-user filename lookups from the real-time streams
+        collection.create_index([("user_email", ASCENDING), ("filename", ASCENDING)])
+        # Lazy annotated-image rendering finds its document by output path
+        collection.create_index("annotated_path")
+    # A retried upload job upserts its documents instead of storing them twice
+    images_collection.create_index(
+        [("job_id", ASCENDING), ("filename", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"job_id": {"$exists": True}}
+    )
+    try:
+        users_collection.create_index("email", unique=True)
+    except OperationFailure as e:
+        app.logger.warning(f"Could not create unique email index, falling back to non-unique: {e}")
+        users_collection.create_index("email")
+    if "user_email_1_source_1" in ingest_cursors_collection.index_information():
+        # Superseded by the per-session index below
+        ingest_cursors_collection.drop_index("user_email_1_source_1")
+    ingest_cursors_collection.create_index(
+        [("user_email", ASCENDING), ("source", ASCENDING), ("session_id", ASCENDING)], unique=True
+    )
+    dedup_index.ensure_indexes()
+    stale = dedup_index.purge_stale()
+    if stale:
+        app.logger.info(f"Dropped {stale} dedup entries from another model or settings")
+
+
+ensure_indexes()
+
+sidecar_writer = SidecarWriter(gzip_copy=ANNOTATION_SIDECAR_GZIP, brotli_copy=ANNOTATION_SIDECAR_BROTLI)
+# Ingestion publishes each processed image once; every real-time stream subscribes
+detection_broker = EventBroker(buffer_size=STREAM_REPLAY_EVENTS, max_queue=STREAM_SUBSCRIBER_BUFFER)
+
+# Load YOLO model behind the batching inference engine, or hand batches to the inference pool
+pool_client = None
+if INFERENCE_POOL_ADDRESS:
+    # Connects on first use, so web workers may boot before the pool has loaded its models
+    pool_client = PoolClient(INFERENCE_POOL_ADDRESS, INFERENCE_POOL_AUTHKEY, timeout=INFERENCE_POOL_TIMEOUT)
+    app.logger.info(f"Using inference pool at {INFERENCE_POOL_ADDRESS}")
+engine = InferenceEngine(
+    WEIGHTS,
+    conf=CONF_THRESH,
+    iou=IOU_THRESH,
+    device='cpu',
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    model=pool_client or load_model(WEIGHTS, INFERENCE_BACKEND, INFERENCE_PRECISION, auto_export=INFERENCE_AUTO_EXPORT),
+    # One batch in flight per pool worker
+    dispatchers=INFERENCE_POOL_WORKERS if pool_client else 1
+)
 
 # Sample demo data (will be filtered by user email)
 demo_data = {
@@ -101,21 +257,22 @@ demo_data = {
     ]
 }
 
-# Global variables for real-time analysis
-fetching_thread = None
-stop_fetching = threading.Event()
-current_api_key = None
+credential_cache = CredentialCache(ttl=AUTH_CACHE_TTL)
+token_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='auth-token')
 
 
 # Authentication setup
-@auth.verify_password
+@basic_auth.verify_password
 def verify_password(email, password):
     # print(f"Verifying credentials: email={email}, password={password}")
-    user = users_collection.find_one({"email": email})
+    if credential_cache.check(email, password):
+        return email
+    user = users_collection.find_one({"email": email}, {"password": 1})
     if user:
         # print(f"User found: {user}")
         if user["password"] == password:
             # print("Authentication successful")
+            credential_cache.store(email, password)
             return email
         else:
             # print(f"Password mismatch: stored={user['password']}, provided={password}")
@@ -125,6 +282,15 @@ def verify_password(email, password):
     return None
 
 
+@token_auth.verify_token
+def verify_token(token):
+    """Accept a signed bearer token without touching the database."""
+    try:
+        return token_serializer.loads(token, max_age=TOKEN_TTL)["email"]
+    except (BadSignature, SignatureExpired, KeyError, TypeError):
+        return None
+
+
 # Helper to get current user email
 @auth.login_required
 def get_current_user_email():
@@ -147,6 +313,15 @@ def login():
     return jsonify({"message": "Login successful", "email": user_email}), 200
 
 
+@app.route('/token', methods=['POST'])
+@basic_auth.login_required
+def issue_token():
+    """Exchange Basic credentials for a signed bearer token."""
+    user_email = basic_auth.current_user()
+    token = token_serializer.dumps({"email": user_email})
+    return jsonify({"token": token, "token_type": "Bearer", "expires_in": TOKEN_TTL}), 200
+
+
 @app.route('/logout', methods=['POST'])
 def logout():
     response = jsonify({"message": "Logout successful"})
@@ -193,6 +368,7 @@ def register():
         "createdAt": datetime.datetime.utcnow().isoformat()
     }
     users_collection.insert_one(user_data)
+    credential_cache.invalidate(email)
     return jsonify({"message": "User registered successfully"}), 201
 
 
@@ -211,149 +387,179 @@ def extract_georeferencing(image_path):
         return None, 0.1
 
 
-def process_image(image_path, output_dir):
-    """Process an image with the YOLO model and save results to the specified output directory."""
-    results = model.predict(
-        source=image_path,
-        conf=CONF_THRESH,
-        iou=IOU_THRESH,
-        device='cpu',
-        verbose=False,
-        save=False
-    )
-    r = results[0]
-
-    transform, scaling_factor = extract_georeferencing(image_path)
-    base_lat = 34.0522
-    base_lng = -118.2437
-
-    boxes = r.boxes.xyxy.tolist()
-    scores = r.boxes.conf.tolist()
-    class_ids = [int(c) for c in r.boxes.cls.tolist()]
-    segs = r.masks.xy if (hasattr(r, "masks") and r.masks is not None) else []
-
-    annotations = []
-    for idx, (box, score, cid) in enumerate(zip(boxes, scores, class_ids)):
-        segmentation = [segs[idx].flatten().tolist()] if idx < len(segs) else []
-        width = box[2] - box[0]
-        height = box[3] - box[1]
-        area_pixels = width * height
-        area_meters = area_pixels * scaling_factor * scaling_factor
-        center_x = (box[0] + box[2]) / 2
-        center_y = (box[1] + box[3]) / 2
-
-        if transform:
-            lng, lat = transform * (center_x, center_y)
-        else:
-            offset = idx * 0.001
-            lat = base_lat + offset
-            lng = base_lng + offset
-
-        annotations.append({
-            "id": idx,
-            "category_id": cid,
-            "class": model.names[cid],
-            "score": float(score),
-            "box": [float(x) for x in box],
-            "segmentation": segmentation,
-            "area": float(area_meters),
-            "location": {"lat": float(lat), "lng": float(lng)}
-        })
+def process_image(image_path, output_dir, key=None):
+    """Process an image with the YOLO model and save results to the specified output directory.
+
+    ``key`` identifies the caller (e.g. a real-time session) for fair scheduling in the engine.
+    """
+    digest = content_hash(image_path) if DEDUP_ENABLED else None
+    cached = dedup_index.lookup(digest) if digest else None
+    if cached and not ANNOTATED_LAZY and not os.path.exists(cached["annotated_path"]):
+        cached = None
+
+    annotated = None
+    if cached:
+        # Same bytes were processed before, possibly under another name; reuse that result
+        meta = dict(cached["meta"], image=os.path.basename(image_path))
+    elif TILED_INFERENCE and should_tile(image_path, TILE_SIZE):
+        # Large orthophotos are streamed tile by tile instead of being downsized whole
+        meta, annotated = tiled_predict(
+            image_path,
+            engine,
+            tile_size=TILE_SIZE,
+            overlap=TILE_OVERLAP,
+            batch_tiles=TILE_BATCH,
+            iou_thresh=IOU_THRESH,
+            key=key,
+            render=not ANNOTATED_LAZY
+        )
+    else:
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        r = engine.predict(image, key=key)
+        transform, scaling_factor = extract_georeferencing(image_path)
+        annotations = annotations_from_result(r, engine.names, transform, scaling_factor)
+        meta = build_meta(image_path, r.orig_shape[1], r.orig_shape[0], engine.names, annotations, scaling_factor)
+        if not ANNOTATED_LAZY:
+            annotated = render_overlay(image, annotations)
+    if not cached:
+        meta = encode_meta(meta, SEGMENTATION_ENCODING, SEGMENTATION_TOLERANCE)
 
     # Define output paths in the specified output_dir
     base, _ = os.path.splitext(os.path.basename(image_path))
-    out_json = os.path.join(output_dir, f"{base}_annotations.json")
-    out_img = os.path.join(output_dir, f"{base}_annotated.png")
+    out_json = os.path.join(output_dir, f"{base}_annotations.json") if ANNOTATION_SIDECAR != 'off' else None
+    out_img = os.path.join(output_dir, f"{base}_annotated.{ANNOTATED_FORMAT}")
     # Copy original image to output_dir if it's not already there
     original_out_path = os.path.join(output_dir, os.path.basename(image_path))
     if image_path != original_out_path:
         shutil.copy(image_path, original_out_path)
 
-    # Save annotations JSON
-    meta = {
-        "image": os.path.basename(image_path),
-        "width": int(r.orig_shape[1]),
-        "height": int(r.orig_shape[0]),
-        "categories": [{"id": i, "name": n} for i, n in model.names.items()],
-        "annotations": annotations,
-        "scaling_factor": float(scaling_factor)
-    }
-    with open(out_json, "w") as f:
-        json.dump(meta, f, indent=2)
+    # Save annotations JSON off the request path
+    if out_json:
+        sidecar_writer.write(out_json, meta)
 
-    # Save annotated image
-    annotated = r.plot()
-    cv2.imwrite(out_img, annotated)
+    # Save annotated image; in lazy mode it is rendered by the output route on first request
+    if annotated is not None:
+        save_image(out_img, annotated, ANNOTATED_QUALITY)
+    elif (cached and os.path.exists(cached["annotated_path"])
+          and os.path.abspath(cached["annotated_path"]) != os.path.abspath(out_img)):
+        link_or_copy(cached["annotated_path"], out_img)
+    if digest and not cached:
+        dedup_index.record(digest, meta, out_img)
 
-    return out_json, out_img, original_out_path
+    return ProcessResult(meta, out_json, out_img, original_out_path)
 
 
-def save_to_db(filename, out_json, out_img, original_path, user_email, collection='images'):
-    """Save image metadata and results to the specified MongoDB collection."""
-    with open(out_json) as f:
-        annotations_data = json.load(f)
-
-    target_collection = images_collection if collection == 'images' else realtime_images_collection
-    image_doc = {
+def image_document(filename, result, user_email):
+    """The stored document for one processed image."""
+    annotations_data = result.meta
+    return {
         "user_email": user_email,
         "filename": filename,
-        "original_path": original_path,
-        "annotated_path": out_img,
+        "original_path": result.original_path,
+        "annotated_path": result.out_img,
         "annotations": annotations_data,
+        "summary": summarize_annotations(annotations_data.get("annotations", [])),
         "processed_at": datetime.datetime.utcnow()
     }
-    result = target_collection.insert_one(image_doc)
+
+
+def save_to_db(filename, result, user_email, collection='images'):
+    """Save image metadata and results to the specified MongoDB collection."""
+    target_collection = images_collection if collection == 'images' else realtime_images_collection
+    result = target_collection.insert_one(image_document(filename, result, user_email))
     return str(result.inserted_id)
 
 
-def fetch_and_process_images(api_key, user_email):
-    """Fetch images from the image server every 5 seconds, process them, and store in MongoDB."""
-    global fetching_thread, current_api_key
-    current_api_key = api_key
-    processed_images = set()
+def save_job_documents(job, docs):
+    """Store a job's documents, upserted on (job_id, filename); returns {filename: image id}.
 
-    while not stop_fetching.is_set():
-        try:
-            response = requests.get(
-                IMAGE_SERVER_URL,
-                headers={'X-API-Key': api_key},
-                timeout=10
-            )
-            response.raise_for_status()
-            image_urls = response.json().get('images', [])
-
-            for image_url in image_urls:
-                filename = os.path.basename(urllib.parse.urlparse(image_url).path)
-                if filename in processed_images or not allowed_file(filename):
-                    continue
+    A job retried after a crash or lease expiry may have stored some of them
+    already, so every attempt rewrites the same documents instead of adding more.
+    """
+    ops = [UpdateOne({"job_id": job["_id"], "filename": doc["filename"]},
+                     {"$set": dict(doc, job_id=job["_id"])}, upsert=True)
+           for doc in docs]
+    images_collection.bulk_write(ops, ordered=False)
+    stored = images_collection.find(
+        {"job_id": job["_id"], "filename": {"$in": [doc["filename"] for doc in docs]}},
+        {"filename": 1}
+    )
+    return {doc["filename"]: str(doc["_id"]) for doc in stored}
 
-                image_response = requests.get(
-                    image_url,
-                    headers={'X-API-Key': api_key},
-                    timeout=10
-                )
-                image_response.raise_for_status()
 
-                file_path = os.path.join(app.config['IMAGES_FOLDER'], filename)
-                with open(file_path, 'wb') as f:
-                    f.write(image_response.content)
+def load_ingest_cursor(session):
+    """Return the last committed image-server cursor for this session, if any."""
+    doc = ingest_cursors_collection.find_one({
+        "user_email": session.user_email,
+        "source": IMAGE_SERVER_URL,
+        "session_id": session.id
+    })
+    return doc["cursor"] if doc else None
 
-                out_json, out_img, original_out_path = process_image(file_path, app.config['REALTIME_OUTPUT_DIR'])
-                save_to_db(filename, out_json, out_img, original_out_path, user_email, collection='realtime_images')
-                processed_images.add(filename)
 
-        except requests.RequestException as e:
-            app.logger.error(f"Error fetching images from server: {str(e)}")
-        except Exception as e:
-            app.logger.error(f"Unexpected error in fetch_and_process_images: {str(e)}")
+def save_ingest_cursor(session, cursor):
+    ingest_cursors_collection.update_one(
+        {"user_email": session.user_email, "source": IMAGE_SERVER_URL, "session_id": session.id},
+        {"$set": {"cursor": cursor, "updated_at": datetime.datetime.utcnow()}},
+        upsert=True
+    )
 
-        time.sleep(5)
+
+def save_realtime_result(filename, result, session):
+    """Store a real-time result and publish its detections to the session's streams."""
+    image_id = save_to_db(filename, result, session.user_email, collection='realtime_images')
+    detection_broker.publish(session.id, {
+        "image": filename,
+        "detections": detections_from_annotations(filename, result.meta["annotations"])
+    })
+    return image_id
+
+
+def session_output_dir(session_id):
+    """Real-time output directory of one session, so sessions never overwrite each other's files."""
+    output_dir = os.path.join(app.config['REALTIME_OUTPUT_DIR'], session_id)
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+
+def served_name(path, directory):
+    """Path of a stored file relative to the folder its route serves, as used in URLs."""
+    return os.path.relpath(path, directory).replace(os.sep, '/')
+
+
+def fetch_and_process_images(session):
+    """Run the staged download/inference/write pipeline until the session is stopped."""
+    output_dir = session_output_dir(session.id)
+
+    session.pipeline = IngestPipeline(
+        IMAGE_SERVER_URL,
+        session.api_key,
+        session.working_dir,
+        # Sessions share the engine; the key gives each one a fair share of every batch
+        process_fn=lambda file_path: process_image(file_path, output_dir, key=session.id),
+        save_fn=lambda filename, result: save_realtime_result(filename, result, session),
+        stop_event=session.stop_event,
+        allowed_fn=allowed_file,
+        downloaders=INGEST_DOWNLOADERS,
+        inference_workers=INGEST_INFERENCE_WORKERS,
+        queue_size=INGEST_QUEUE_SIZE,
+        poll_interval=INGEST_POLL_INTERVAL,
+        cursor=load_ingest_cursor(session),
+        on_cursor=lambda cursor: save_ingest_cursor(session, cursor)
+    )
+    session.pipeline.run()
+
+
+# Concurrent real-time ingestion sessions, one per (user, API key)
+sessions = SessionManager(IMAGES_FOLDER, fetch_and_process_images)
 
 
 @app.route('/upload', methods=['POST'])
 @auth.login_required
 def upload_file():
-    """Handle image upload, process with YOLO, and store in MongoDB."""
+    """Save an uploaded image and queue it for processing; returns 202 with a job id."""
     user_email = get_current_user_email()
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -364,21 +570,194 @@ def upload_file():
         return jsonify({"error": "File type not allowed"}), 400
 
     try:
-        filename = file.filename
+        # Never overwrite an earlier upload: its outputs are cached as immutable. The name is
+        # reserved atomically, so concurrent uploads of the same name cannot share it
+        filename = unique_name(app.config['UPLOAD_FOLDER'], os.path.basename(file.filename), set())
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(file_path)
 
-        out_json, out_img, original_out_path = process_image(file_path, app.config['OUTPUT_DIR'])
-        image_id = save_to_db(filename, out_json, out_img, original_out_path, user_email, collection='images')
+        job_id = upload_jobs.enqueue(
+            'upload',
+            {"filename": filename, "file_path": file_path},
+            user_email,
+            priority=request.form.get('priority', 0, type=int)
+        )
 
-        return jsonify({
-            "message": "File uploaded and processed successfully",
-            "image_id": image_id
-        }), 200
+        response = jsonify({
+            "message": "File uploaded and queued for processing",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        })
+        response.headers['Location'] = f"/jobs/{job_id}"
+        return response, 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def run_upload_job(job, progress):
+    """Job handler for /upload: run the model on the saved file and store the result."""
+    payload = job["payload"]
+    progress('processing', 10)
+    result = process_image(payload["file_path"], app.config['OUTPUT_DIR'])
+    progress('saving', 90)
+    image_ids = save_job_documents(job, [image_document(payload["filename"], result, job["user_email"])])
+    return {"image_id": image_ids[payload["filename"]]}
+
+
+@app.route('/upload/bulk', methods=['POST'])
+@auth.login_required
+def upload_bulk():
+    """Accept many images and/or zip/tar archives in one request and queue them in batches.
+
+    Returns 202 with a manifest entry per file: the stored filename and job id,
+    or why it was skipped.
+    """
+    user_email = get_current_user_email()
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    if not uploads:
+        return jsonify({"error": "No files"}), 400
+
+    manifest = []
+    queued = []
+    taken = set()
+    for upload in uploads:
+        try:
+            for entry, fileobj in iter_entries(upload.filename, upload.stream):
+                name = os.path.basename(entry)
+                if name.startswith('.') or not allowed_file(name):
+                    manifest.append({"entry": entry, "status": "skipped", "reason": "File type not allowed"})
+                    continue
+                filename = unique_name(app.config['UPLOAD_FOLDER'], name, taken)
+                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                save_stream(fileobj, file_path)
+                item = {"entry": entry, "filename": filename, "status": "queued"}
+                manifest.append(item)
+                queued.append((item, {"filename": filename, "file_path": file_path}))
+        except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+            manifest.append({"entry": upload.filename, "status": "error", "reason": f"Unreadable archive: {e}"})
+
+    priority = request.form.get('priority', 0, type=int)
+    job_ids = []
+    for start in range(0, len(queued), BULK_JOB_SIZE):
+        chunk = queued[start:start + BULK_JOB_SIZE]
+        job_id = upload_jobs.enqueue('bulk', {"files": [f for _, f in chunk]}, user_email, priority=priority)
+        job_ids.append(job_id)
+        for item, _ in chunk:
+            item["job_id"] = job_id
+
+    return jsonify({
+        "message": f"{len(queued)} images queued for processing",
+        "job_ids": job_ids,
+        "queued": len(queued),
+        "skipped": len(manifest) - len(queued),
+        "manifest": manifest
+    }), 202
+
+
+def run_bulk_job(job, progress):
+    """Job handler for /upload/bulk: process a batch of files and store them with one bulk write."""
+    files = job["payload"]["files"]
+    outcomes = {}
+    docs = []
+    # Concurrent submissions let the inference engine fill its micro-batches
+    with ThreadPoolExecutor(max_workers=BULK_PROCESS_THREADS) as pool:
+        futures = {pool.submit(process_image, f["file_path"], app.config['OUTPUT_DIR']): f for f in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            filename = futures[future]["filename"]
+            try:
+                docs.append(image_document(filename, future.result(), job["user_email"]))
+                outcomes[filename] = {"filename": filename, "status": "done"}
+            except Exception as e:
+                app.logger.error(f"Bulk job {job['_id']}: could not process {filename}: {e}")
+                outcomes[filename] = {"filename": filename, "status": "failed", "error": str(e)}
+            progress('processing', int(90 * done / len(files)))
+
+    progress('saving', 95)
+    if docs:
+        for filename, image_id in save_job_documents(job, docs).items():
+            outcomes[filename]["image_id"] = image_id
+
+    results = [outcomes[f["filename"]] for f in files]
+    return {
+        "files": results,
+        "processed": len(docs),
+        "failed": len(results) - len(docs)
+    }
+
+
+JOB_HANDLERS = {
+    'upload': run_upload_job,
+    'bulk': run_bulk_job
+}
+
+
+def run_job(job, progress):
+    return JOB_HANDLERS[job["kind"]](job, progress)
+
+
+# Persistent upload queue; every web process runs JOB_WORKERS workers claiming from it
+upload_jobs = JobQueue(
+    db['jobs'],
+    run_job,
+    workers=JOB_WORKERS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    lease_seconds=JOB_LEASE_SECONDS
+)
+upload_jobs.ensure_indexes()
+_job_workers_started = False
+_job_workers_lock = threading.Lock()
+
+
+@app.before_request
+def start_job_workers():
+    """Start the job workers in processes that serve requests.
+
+    Importing the module (CLI commands, benchmarks) must not start workers that
+    could claim a job and exit halfway through it, leaving it leased.
+    """
+    global _job_workers_started
+    if _job_workers_started:
+        return
+    with _job_workers_lock:
+        if not _job_workers_started and JOB_WORKERS > 0:
+            upload_jobs.start()
+        _job_workers_started = True
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@auth.login_required
+def get_job(job_id):
+    """Status, progress and result of a background job."""
+    job = upload_jobs.get(job_id, get_current_user_email())
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_status(job)), 200
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@auth.login_required
+def job_events(job_id):
+    """Stream a job's status as NDJSON whenever it changes, until it finishes."""
+    user_email = get_current_user_email()
+    if not upload_jobs.get(job_id, user_email):
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        last_update = None
+        while True:
+            job = upload_jobs.get(job_id, user_email)
+            if job is None:
+                return
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield json.dumps(job_status(job)) + "\n"
+            if job["status"] in ('done', 'failed'):
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 @app.route('/images-uploaded', methods=['OPTIONS'])
 def images_uploaded_options():
     response = jsonify({"status": "ok"})
@@ -389,35 +768,103 @@ def images_uploaded_options():
     return response, 200
 
 
+def encode_page_cursor(doc):
+    raw = f"{doc['processed_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_page_cursor(cursor):
+    """Inverse of encode_page_cursor; raises ValueError for malformed cursors."""
+    try:
+        processed_at, image_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+        return datetime.datetime.fromisoformat(processed_at), ObjectId(image_id)
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor}") from e
+
+
+def listing_pipeline(user_email, source, limit=None, after=None):
+    """Aggregation stages listing one collection newest first with server-side counts."""
+    match = {"user_email": user_email}
+    if after:
+        processed_at, image_id = after
+        match["$or"] = [
+            {"processed_at": {"$lt": processed_at}},
+            {"processed_at": processed_at, "_id": {"$lt": image_id}}
+        ]
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"processed_at": -1, "_id": -1}}
+    ]
+    if limit:
+        pipeline.append({"$limit": limit + 1})
+    # Only indexed fields are projected so the listing never touches the documents
+    pipeline += [
+        {"$project": {
+            "filename": 1,
+            "processed_at": 1,
+            "summary.detection_count": 1,
+            "summary.mean_confidence": 1
+        }},
+        {"$addFields": {"source": source}}
+    ]
+    return pipeline
+
+
+def list_images(user_email, include_realtime):
+    """Run the listing for the request's ?limit=&after= page; returns (docs, next_cursor)."""
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
+    after = decode_page_cursor(after) if after else None
+
+    pipeline = listing_pipeline(user_email, "uploaded", limit, after)
+    if include_realtime:
+        # Merge both collections into one newest-first view
+        pipeline += [
+            {"$unionWith": {
+                "coll": realtime_images_collection.name,
+                "pipeline": listing_pipeline(user_email, "realtime", limit, after)
+            }},
+            {"$sort": {"processed_at": -1, "_id": -1}}
+        ]
+        if limit:
+            pipeline.append({"$limit": limit + 1})
+
+    docs = list(images_collection.aggregate(pipeline))
+    next_cursor = None
+    if limit and len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_page_cursor(docs[-1])
+    return docs, next_cursor
+
+
 @app.route('/images-uploaded', methods=['GET'])
 @auth.login_required
 def get_uploaded_images():
     """Retrieve list of processed images only from the images collection for the current user."""
     user_email = get_current_user_email()
-    images_list = []
-
-    for img in images_collection.find({"user_email": user_email}):
-        annotations = img.get("annotations", {}).get("annotations", [])
-        confidence_scores = [ann["score"] for ann in annotations if "score" in ann]
-        avg_confidence = (
-            sum(confidence_scores) / len(confidence_scores)
-            if confidence_scores
-            else 0
-        )
+    try:
+        docs, next_cursor = list_images(user_email, include_realtime=False)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        images_list.append({
+    images_list = [
+        {
             "id": str(img["_id"]),
             "filename": img["filename"],
             "processed_at": img["processed_at"].isoformat(),
-            "detection_count": len(annotations),
-            "confidence": avg_confidence,
+            "detection_count": img.get("summary", {}).get("detection_count", 0),
+            "confidence": img.get("summary", {}).get("mean_confidence", 0),
             "status": "complete",
             "source": "uploaded"
-        })
+        }
+        for img in docs
+    ]
 
     response = jsonify(images_list)
     response.headers.add('Access-Control-Allow-Origin', 'http://localhost:5173')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return response, 200
 
 
@@ -426,27 +873,26 @@ def get_uploaded_images():
 def get_images():
     """Retrieve list of processed images from both collections for the current user."""
     user_email = get_current_user_email()
-    images_list = []
-
-    for img in images_collection.find({"user_email": user_email}):
-        images_list.append({
-            "id": str(img["_id"]),
-            "filename": img["filename"],
-            "processed_at": img["processed_at"].isoformat(),
-            "detection_count": len(img["annotations"]["annotations"]),
-            "source": "uploaded"
-        })
+    try:
+        docs, next_cursor = list_images(user_email, include_realtime=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    for img in realtime_images_collection.find({"user_email": user_email}):
-        images_list.append({
+    images_list = [
+        {
             "id": str(img["_id"]),
             "filename": img["filename"],
             "processed_at": img["processed_at"].isoformat(),
-            "detection_count": len(img["annotations"]["annotations"]),
-            "source": "realtime"
-        })
+            "detection_count": img.get("summary", {}).get("detection_count", 0),
+            "source": img["source"]
+        }
+        for img in docs
+    ]
 
-    return jsonify(images_list), 200
+    response = jsonify(images_list)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
 
 
 @app.route('/images/<image_id>', methods=['GET'])
@@ -463,12 +909,25 @@ def get_image_details(image_id):
         return jsonify({"error": "Image not found or unauthorized"}), 404
 
     base_url = request.url_root
-    folder = 'outputs' if collection_name == 'images' else 'real-time-outputs'
+    if collection_name == 'images':
+        folder, original_folder, original = 'outputs', 'uploads', img["filename"]
+        annotated = served_name(img['annotated_path'], OUTPUT_DIR)
+    else:
+        folder = original_folder = 'real-time-outputs'
+        original = served_name(img['original_path'], REALTIME_OUTPUT_DIR)
+        annotated = served_name(img['annotated_path'], REALTIME_OUTPUT_DIR)
+    if request.args.get('segmentation') == 'polygon':
+        # Decode compact encodings for clients that draw polygons
+        img["annotations"] = polygon_meta(img["annotations"])
     return jsonify({
         "id": str(img["_id"]),
         "filename": img["filename"],
-        "original_url": f"{base_url}uploads/{img['filename']}" if collection_name == 'images' else f"{base_url}{folder.lower()}/{img['filename']}",
-        "annotated_url": f"{base_url}{folder.lower()}/{os.path.basename(img['annotated_path'])}",
+        "original_url": f"{base_url}{original_folder}/{original}",
+        "annotated_url": f"{base_url}{folder}/{annotated}",
+        "derivatives": {
+            "original": derivative_urls(base_url, original_folder, original, img["annotations"]),
+            "annotated": derivative_urls(base_url, folder, annotated, img["annotations"])
+        },
         "annotations": img["annotations"],
         "processed_at": img["processed_at"].isoformat(),
         "detections": [
@@ -507,14 +966,18 @@ def delete_image(image_id):
         original_path = img["original_path"]
         annotated_path = img["annotated_path"]
         base, _ = os.path.splitext(os.path.basename(original_path))
-        annotations_json = os.path.join(
-            app.config['OUTPUT_DIR'] if collection_name == 'images' else app.config['REALTIME_OUTPUT_DIR'],
-            f"{base}_annotations.json"
-        )
+        # Sidecars sit next to the annotated image (a session's directory for real-time results)
+        annotations_json = os.path.join(os.path.dirname(annotated_path), f"{base}_annotations.json")
 
-        for file_path in [original_path, annotated_path, annotations_json]:
+        for file_path in [original_path, annotated_path, annotations_json, f"{annotations_json}.gz", f"{annotations_json}.br"]:
             if os.path.exists(file_path):
                 os.remove(file_path)
+        if collection_name == 'images':
+            derivative_store.purge('uploads', img["filename"])
+            derivative_store.purge('outputs', served_name(annotated_path, OUTPUT_DIR))
+        else:
+            derivative_store.purge('real-time-outputs', served_name(original_path, REALTIME_OUTPUT_DIR))
+            derivative_store.purge('real-time-outputs', served_name(annotated_path, REALTIME_OUTPUT_DIR))
 
         target_collection = images_collection if collection_name == 'images' else realtime_images_collection
         target_collection.delete_one({"_id": ObjectId(image_id)})
@@ -524,28 +987,125 @@ def delete_image(image_id):
         return jsonify({"error": str(e)}), 500
 
 
+# Uploads, fetched images and real-time outputs can be replaced under the same name (a re-ingested
+# file, a dedup hit), so clients revalidate them; upload outputs are written once and cached per
+# ARTEFACT_CACHE_CONTROL.
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """Serve original uploaded images."""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    return send_artefact(UPLOAD_FOLDER, filename, REVALIDATE)
+
+
+def ensure_annotated(output_dir, filename, collection):
+    """Render a lazily deferred annotated image from its stored original and annotations."""
+    path = safe_join(output_dir, filename)
+    if path is None or os.path.exists(path) or '_annotated.' not in filename:
+        return
+    doc = collection.find_one({"annotated_path": path}, {"original_path": 1, "annotations.annotations": 1})
+    if not doc:
+        return
+    annotations = doc["annotations"]["annotations"]
+    if should_tile(doc["original_path"], TILE_SIZE):
+        # Large rasters get the same decimated overview as eager tiled inference, never a full decode
+        save_image(path, render_annotations_overview(doc["original_path"], annotations), ANNOTATED_QUALITY)
+        return
+    image = cv2.imread(doc["original_path"], cv2.IMREAD_COLOR)
+    if image is None:
+        app.logger.error(f"Cannot render {path}: original {doc['original_path']} is unreadable")
+        return
+    save_image(path, render_overlay(image, annotations), ANNOTATED_QUALITY)
 
 
 @app.route('/outputs/<path:filename>')
 def output_file(filename):
     """Serve annotated images from OUTPUT_DIR."""
-    return send_from_directory(OUTPUT_DIR, filename)
+    if ANNOTATED_LAZY:
+        ensure_annotated(OUTPUT_DIR, filename, images_collection)
+    return send_artefact(OUTPUT_DIR, filename, ARTEFACT_CACHE_CONTROL)
 
 
 @app.route('/real-time-outputs/<path:filename>')
 def realtime_output_file(filename):
     """Serve images and annotations from Real-time-outputs."""
-    return send_from_directory(REALTIME_OUTPUT_DIR, filename)
+    if ANNOTATED_LAZY:
+        ensure_annotated(REALTIME_OUTPUT_DIR, filename, realtime_images_collection)
+    return send_artefact(REALTIME_OUTPUT_DIR, filename, REVALIDATE)
 
 
 @app.route('/images/<path:filename>')
 def image_file(filename):
     """Serve images from IMAGES_FOLDER."""
-    return send_from_directory(IMAGES_FOLDER, filename)
+    return send_artefact(IMAGES_FOLDER, filename, REVALIDATE)
+
+
+# Thumbnails and zoom tiles of the images served above, generated on first request
+derivative_store = DerivativeStore(
+    DERIVATIVES_DIR,
+    {'uploads': UPLOAD_FOLDER, 'outputs': OUTPUT_DIR, 'real-time-outputs': REALTIME_OUTPUT_DIR},
+    tile_size=PYRAMID_TILE_SIZE,
+    thumb_sizes=THUMBNAIL_SIZES
+)
+DERIVATIVE_COLLECTIONS = {'outputs': (OUTPUT_DIR, images_collection),
+                          'real-time-outputs': (REALTIME_OUTPUT_DIR, realtime_images_collection)}
+
+
+def derivative_urls(base_url, folder, filename, meta):
+    """Thumbnail bucket URLs for an image, plus its tile pyramid when the raster is large."""
+    prefix = f"{base_url}derivatives/{folder}/{filename}"
+    tiles = None
+    if max(meta.get("width", 0), meta.get("height", 0)) > TILE_PYRAMID_MIN_SIZE:
+        tiles = {
+            "url": prefix + "/tiles/{z}/{x}/{y}." + derivative_store.fmt,
+            "info_url": f"{prefix}/tiles.json",
+            "tile_size": PYRAMID_TILE_SIZE
+        }
+    return {
+        "thumbnails": {str(size): f"{prefix}/thumb/{size}" for size in THUMBNAIL_SIZES},
+        "tiles": tiles
+    }
+
+
+def _derivative_source(folder, filename):
+    """Make sure a lazily rendered source exists and return the Cache-Control for its derivatives."""
+    if ANNOTATED_LAZY and folder in DERIVATIVE_COLLECTIONS:
+        output_dir, collection = DERIVATIVE_COLLECTIONS[folder]
+        ensure_annotated(output_dir, filename, collection)
+    # Derivatives are cached like their source file
+    return ARTEFACT_CACHE_CONTROL if folder == 'outputs' else REVALIDATE
+
+
+@app.route('/derivatives/<folder>/<path:filename>/thumb/<int:size>')
+def derivative_thumbnail(folder, filename, size):
+    """Serve a cached thumbnail, bucketed to the nearest configured size."""
+    try:
+        cache_control = _derivative_source(folder, filename)
+        path = derivative_store.thumbnail(folder, filename, size)
+    except (FileNotFoundError, ValueError):
+        return jsonify({"error": "Image not found"}), 404
+    return send_artefact(os.path.dirname(path), os.path.basename(path), cache_control)
+
+
+@app.route('/derivatives/<folder>/<path:filename>/tiles.json')
+def derivative_tiles_info(folder, filename):
+    """Dimensions and zoom range of an image's tile pyramid."""
+    try:
+        _derivative_source(folder, filename)
+        return jsonify(derivative_store.info(folder, filename)), 200
+    except (FileNotFoundError, ValueError):
+        return jsonify({"error": "Image not found"}), 404
+
+
+@app.route('/derivatives/<folder>/<path:filename>/tiles/<int:z>/<int:x>/<int:y>.<ext>')
+def derivative_tile(folder, filename, z, x, y, ext):
+    """Serve one XYZ tile, generating and caching it on first request."""
+    try:
+        cache_control = _derivative_source(folder, filename)
+        path = derivative_store.tile(folder, filename, z, x, y)
+    except (FileNotFoundError, ValueError):
+        return jsonify({"error": "Image not found"}), 404
+    if path is None:
+        return jsonify({"error": "Tile out of range"}), 404
+    return send_artefact(os.path.dirname(path), os.path.basename(path), cache_control)
 
 
 # Helper to determine user email for real-time endpoints
@@ -554,68 +1114,98 @@ def get_user_email_for_realtime():
         auth_header = request.headers.get('Authorization')
         if auth_header:
             # If Authorization header is present, attempt to authenticate
-            username, password = auth_header.split(' ')[1], None
-            # Flask-HTTPAuth expects the verify_password to handle this, but we can decode manually
-            import base64
-            decoded = base64.b64decode(username).decode('utf-8')
-            email, _ = decoded.split(':', 1)
-            user = users_collection.find_one({"email": email})
-            if user:
+            scheme, credentials = auth_header.split(' ', 1)
+            if scheme.lower() == 'bearer':
+                email = verify_token(credentials)
+            else:
+                decoded = base64.b64decode(credentials).decode('utf-8')
+                email, password = decoded.split(':', 1)
+                email = verify_password(email, password)
+            if email:
+                return email
+        elif request.args.get('token'):
+            # EventSource cannot set headers, so SSE clients pass a bearer token in the query
+            email = verify_token(request.args['token'])
+            if email:
                 return email
     except Exception as e:
         app.logger.debug(f"Could not authenticate user for real-time: {str(e)}")
     return "unknown@gmail.com"
 
 
+def detections_from_annotations(selected, annotations):
+    """Build the real-time NDJSON detections for one image from its stored annotations."""
+    detections = []
+    for idx, ann in enumerate(annotations):
+        x1, y1, x2, y2 = ann["box"]
+        detections.append({
+            "id": f"{selected}_{int(time.time() * 1000)}_{idx}",
+            "location": {
+                "lat": float((y1 + y2) / 2),
+                "lng": float((x1 + x2) / 2)
+            },
+            "area": float((x2 - x1) * (y2 - y1)),
+            "confidence": float(ann["score"]),
+            "type": ann["class"]
+        })
+    return detections
+
+
+def stored_realtime_annotations(user_email, filenames):
+    """Fetch stored annotations for several real-time files in a single query."""
+    if not filenames:
+        return {}
+    docs = realtime_images_collection.find(
+        {"user_email": user_email, "filename": {"$in": list(filenames)}},
+        {
+            "filename": 1,
+            "annotations.annotations.box": 1,
+            "annotations.annotations.score": 1,
+            "annotations.annotations.class": 1
+        }
+    )
+    return {doc["filename"]: doc.get("annotations", {}).get("annotations", []) for doc in docs}
+
+
+def session_image_files(user_email):
+    """(filename, path) for every image in the user's session working directories."""
+    files = []
+    for working_dir in sessions.working_dirs(user_email):
+        with os.scandir(working_dir) as it:
+            files.extend((e.name, e.path) for e in it if e.is_file() and allowed_file(e.name))
+    return sorted(files)
+
+
 @app.route('/realtime', methods=['GET'])
 def real_time_analysis():
-    """Stream real-time analysis results for all images in the folder."""
+    """Stream stored real-time results for all images in the folder.
+
+    Files the ingest pipeline has not stored yet are reported as pending.
+    """
     user_email = get_user_email_for_realtime()
 
     def generate():
         try:
-            image_files = [
-                f for f in os.listdir(app.config['IMAGES_FOLDER'])
-                if os.path.isfile(os.path.join(app.config['IMAGES_FOLDER'], f))
-            ]
+            image_files = session_image_files(user_email)
             if not image_files:
                 yield json.dumps({"error": "No images found"}) + "\n"
                 return
 
             total_detections = 0
+            pending = 0
             first_detection_found = False
-
-            for selected in image_files:
-                img_doc = realtime_images_collection.find_one({"filename": selected, "user_email": user_email})
-                if not img_doc:
+            stored = stored_realtime_annotations(user_email, [name for name, _ in image_files])
+
+            for selected, path in image_files:
+                annotations = stored.get(selected)
+                if annotations is None:
+                    # The ingest pipeline that downloaded it is still processing (or retrying) it;
+                    # running the model here too would store it twice
+                    pending += 1
+                    yield json.dumps({"image": selected, "pending": True}) + "\n"
                     continue
 
-                path = os.path.join(app.config['IMAGES_FOLDER'], selected)
-                img = cv2.imread(path)
-                if img is None:
-                    yield json.dumps({"image": selected, "error": "Invalid image file"}) + "\n"
-                    continue
-
-                results = model.predict(img, save=False)[0]
-                boxes = results.boxes.xyxy.cpu().numpy()
-                scores = results.boxes.conf.cpu().numpy()
-                classes = results.boxes.cls.cpu().numpy()
-                names = results.names
-
-                detections = []
-                for idx, ((x1, y1, x2, y2), score, cls) in enumerate(zip(boxes, scores, classes)):
-                    detection = {
-                        "id": f"{selected}_{int(time.time() * 1000)}_{idx}",
-                        "location": {
-                            "lat": float((y1 + y2) / 2),
-                            "lng": float((x1 + x2) / 2)
-                        },
-                        "area": float((x2 - x1) * (y2 - y1)),
-                        "confidence": float(score),
-                        "type": names[int(cls)]
-                    }
-                    detections.append(detection)
-
+                detections = detections_from_annotations(selected, annotations)
                 total_detections += len(detections)
                 if not first_detection_found and len(detections) > 0:
                     first_detection_found = True
@@ -628,7 +1218,8 @@ def real_time_analysis():
 
             yield json.dumps({
                 "completed": True,
-                "totalDetections": total_detections
+                "totalDetections": total_detections,
+                "pending": pending
             }) + "\n"
 
         except Exception as e:
@@ -638,19 +1229,36 @@ def real_time_analysis():
     return Response(stream_with_context(generate()), mimetype='application/json')
 
 
+def stream_published_detections(session_id, last_event_id=None):
+    """Stream detections published by an ingestion session, starting with the replay buffer."""
+    subscriber = detection_broker.subscribe(session_id, last_event_id=last_event_id)
+    first_detection_found = False
+
+    try:
+        while True:
+            events = subscriber.get(timeout=1)
+            if events is None:
+                yield json.dumps({"error": "Stream fell behind; reconnect to resume"}) + "\n"
+                return
+
+            for _, payload in events:
+                if not first_detection_found and len(payload["detections"]) > 0:
+                    first_detection_found = True
+                    yield json.dumps({"firstDetection": True}) + "\n"
+                yield json.dumps(payload) + "\n"
+
+            if request.environ.get('wsgi.input').closed:
+                break
+    finally:
+        subscriber.close()
+
+
 @app.route('/realtime', methods=['POST'])
 def real_time_analysis_from_server():
     """Start or reconnect to real-time analysis for images fetched from the image server."""
-    global fetching_thread, current_api_key
     user_email = get_user_email_for_realtime()
 
-    # Clear previous session data
-    realtime_sessions[user_email] = {
-        'start_time': datetime.datetime.utcnow(),
-        'processed_files': set()
-    }
-
-    def generate(fetching_thread=None):
+    def generate():
         try:
             data = request.get_json()
             if not data or 'apiKey' not in data:
@@ -659,141 +1267,13 @@ def real_time_analysis_from_server():
 
             api_key = data['apiKey']
 
-            if fetching_thread and fetching_thread.is_alive() and current_api_key == api_key:
-                processed_images = set()
-                total_detections = 0
-                first_detection_found = False
-
-                while True:
-                    image_files = [
-                        f for f in os.listdir(app.config['IMAGES_FOLDER'])
-                        if os.path.isfile(os.path.join(app.config['IMAGES_FOLDER'], f)) and allowed_file(f)
-                    ]
-
-                    for selected in image_files:
-                        if selected in processed_images:
-                            continue
-
-                        img_doc = realtime_images_collection.find_one({"filename": selected, "user_email": user_email})
-                        if not img_doc:
-                            continue
-
-                        path = os.path.join(app.config['IMAGES_FOLDER'], selected)
-                        img = cv2.imread(path)
-                        if img is None:
-                            yield json.dumps({"image": selected, "error": "Invalid image file"}) + "\n"
-                            processed_images.add(selected)
-                            continue
-
-                        results = model.predict(img, save=False)[0]
-                        boxes = results.boxes.xyxy.cpu().numpy()
-                        scores = results.boxes.conf.cpu().numpy()
-                        classes = results.boxes.cls.cpu().numpy()
-                        names = results.names
-
-                        detections = []
-                        for idx, ((x1, y1, x2, y2), score, cls) in enumerate(zip(boxes, scores, classes)):
-                            detection = {
-                                "id": f"{selected}_{int(time.time() * 1000)}_{idx}",
-                                "location": {
-                                    "lat": float((y1 + y2) / 2),
-                                    "lng": float((x1 + x2) / 2)
-                                },
-                                "area": float((x2 - x1) * (y2 - y1)),
-                                "confidence": float(score),
-                                "type": names[int(cls)]
-                            }
-                            detections.append(detection)
-
-                        total_detections += len(detections)
-                        if not first_detection_found and len(detections) > 0:
-                            first_detection_found = True
-                            yield json.dumps({"firstDetection": True}) + "\n"
-
-                        yield json.dumps({
-                            "image": selected,
-                            "detections": detections
-                        }) + "\n"
-
-                        processed_images.add(selected)
-
-                    if request.environ.get('wsgi.input').closed:
-                        break
-
-                    time.sleep(1)
-
-                return
+            session = sessions.get(user_email, api_key)
+            if session is None or not session.is_running():
+                # A new session replays nothing from the previous run of the same key
+                detection_broker.clear(SessionManager.session_id(user_email, api_key))
+                session, _ = sessions.start(user_email, api_key)
 
-            for file in os.listdir(app.config['IMAGES_FOLDER']):
-                file_path = os.path.join(app.config['IMAGES_FOLDER'], file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-
-            stop_fetching.clear()
-            fetching_thread = threading.Thread(target=fetch_and_process_images, args=(api_key, user_email))
-            fetching_thread.start()
-
-            processed_images = set()
-            total_detections = 0
-            first_detection_found = False
-
-            while True:
-                image_files = [
-                    f for f in os.listdir(app.config['IMAGES_FOLDER'])
-                    if os.path.isfile(os.path.join(app.config['IMAGES_FOLDER'], f)) and allowed_file(f)
-                ]
-
-                for selected in image_files:
-                    if selected in processed_images:
-                        continue
-
-                    img_doc = realtime_images_collection.find_one({"filename": selected, "user_email": user_email})
-                    if not img_doc:
-                        continue
-
-                    path = os.path.join(app.config['IMAGES_FOLDER'], selected)
-                    img = cv2.imread(path)
-                    if img is None:
-                        yield json.dumps({"image": selected, "error": "Invalid image file"}) + "\n"
-                        processed_images.add(selected)
-                        continue
-
-                    results = model.predict(img, save=False)[0]
-                    boxes = results.boxes.xyxy.cpu().numpy()
-                    scores = results.boxes.conf.cpu().numpy()
-                    classes = results.boxes.cls.cpu().numpy()
-                    names = results.names
-
-                    detections = []
-                    for idx, ((x1, y1, x2, y2), score, cls) in enumerate(zip(boxes, scores, classes)):
-                        detection = {
-                            "id": f"{selected}_{int(time.time() * 1000)}_{idx}",
-                            "location": {
-                                "lat": float((y1 + y2) / 2),
-                                "lng": float((x1 + x2) / 2)
-                            },
-                            "area": float((x2 - x1) * (y2 - y1)),
-                            "confidence": float(score),
-                            "type": names[int(cls)]
-                        }
-                        detections.append(detection)
-
-                    total_detections += len(detections)
-                    if not first_detection_found and len(detections) > 0:
-                        first_detection_found = True
-                        yield json.dumps({"firstDetection": True}) + "\n"
-
-                    yield json.dumps({
-                        "image": selected,
-                        "detections": detections
-                    }) + "\n"
-
-                    processed_images.add(selected)
-
-                if request.environ.get('wsgi.input').closed:
-                    break
-
-                time.sleep(1)
+            yield from stream_published_detections(session.id)
 
         except Exception as e:
             app.logger.error(f"Error during real-time analysis: {str(e)}")
@@ -802,6 +1282,40 @@ def real_time_analysis_from_server():
     return Response(stream_with_context(generate()), mimetype='application/json')
 
 
+@app.route('/realtime/events', methods=['GET'])
+def real_time_events():
+    """Server-Sent Events view of the real-time detection stream, resumable via Last-Event-ID."""
+    user_email = get_user_email_for_realtime()
+    api_key = request.args.get('apiKey')
+    if not api_key:
+        return jsonify({"error": "API key is required"}), 400
+    session_id = SessionManager.session_id(user_email, api_key)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    def generate():
+        subscriber = detection_broker.subscribe(session_id, last_event_id=last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                events = subscriber.get(timeout=15)
+                if events is None:
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+                if not events:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": ping\n\n"
+                for event_id, payload in events:
+                    yield f"id: {event_id}\nevent: detection\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            subscriber.close()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # @app.route('/real-time-outputs/<path:filename>')
 # def realtime_output_file(filename):
 #     """Serve images and annotations from Real-time-outputs."""
@@ -819,12 +1333,20 @@ def get_realtime_image_details(image_id):
 
     base_url = request.url_root
     folder = 'real-time-outputs'
+    original = served_name(img['original_path'], REALTIME_OUTPUT_DIR)
+    annotated = served_name(img['annotated_path'], REALTIME_OUTPUT_DIR)
+    if request.args.get('segmentation') == 'polygon':
+        img["annotations"] = polygon_meta(img["annotations"])
     return jsonify({
         "id": str(img["_id"]),
         "filename": img["filename"],
-        "original_url": f"{base_url}{folder}/{img['filename']}",
-        "annotated_url": f"{base_url}{folder}/{os.path.basename(img['annotated_path'])}",
-        "annotations_url": f"{base_url}{folder}/{os.path.splitext(img['filename'])[0]}_annotations.json",
+        "original_url": f"{base_url}{folder}/{original}",
+        "annotated_url": f"{base_url}{folder}/{annotated}",
+        "derivatives": {
+            "original": derivative_urls(base_url, folder, original, img["annotations"]),
+            "annotated": derivative_urls(base_url, folder, annotated, img["annotations"])
+        },
+        "annotations_url": f"{base_url}{folder}/{os.path.splitext(original)[0]}_annotations.json",
         "annotations": img["annotations"],
         "processed_at": img["processed_at"].isoformat(),
         "detections": [
@@ -849,36 +1371,28 @@ def get_realtime_image_details(image_id):
 @app.route('/stop-realtime', methods=['POST'])
 @auth.login_required
 def stop_real_time_analysis():
-    """Stop the real-time analysis thread."""
-    global fetching_thread, current_api_key
+    """Stop the current user's real-time analysis session for an API key."""
     try:
         data = request.get_json()
         if not data or 'apiKey' not in data:
             return jsonify({"error": "API key is required"}), 400
 
-        api_key = data['apiKey']
-        if current_api_key != api_key:
-            return jsonify({"error": "Invalid API key or no active analysis"}), 400
-
-        if fetching_thread and fetching_thread.is_alive():
-            stop_fetching.set()
-            fetching_thread.join()
-            fetching_thread = None
-            current_api_key = None
+        if sessions.stop(get_current_user_email(), data['apiKey']):
             return jsonify({"message": "Real-time analysis stopped"}), 200
         else:
-            return jsonify({"error": "No active real-time analysis"}), 400
+            return jsonify({"error": "Invalid API key or no active analysis"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/realtime-status', methods=['GET'])
 def real_time_status():
-    """Check if real-time analysis is running."""
+    """Check if real-time analysis is running and report every session."""
     try:
+        statuses = [s.status() for s in sessions.sessions()]
         return jsonify({
-            "isRunning": fetching_thread is not None and fetching_thread.is_alive(),
-            "apiKey": current_api_key
+            "isRunning": any(s["isRunning"] for s in statuses),
+            "sessions": statuses
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -889,16 +1403,17 @@ def real_time_status():
 def get_images_list():
     """Get only current real-time session images"""
     user_email = get_current_user_email()
-    session_data = realtime_sessions.get(user_email)
+    user_sessions = sessions.sessions(user_email)
 
-    if not session_data:
+    if not user_sessions:
         return jsonify({"images": []}), 200
 
     try:
-        # Get images processed after session start
+        # Get images processed since the user's earliest live session started
+        start_time = min(s.started_at for s in user_sessions)
         user_images = realtime_images_collection.find({
             "user_email": user_email,
-            "processed_at": {"$gte": session_data['start_time']}
+            "processed_at": {"$gte": start_time}
         }, {"filename": 1})
 
         filenames = [img["filename"] for img in user_images]
@@ -924,5 +1439,27 @@ def fetch_images():
     return jsonify({"error": "This endpoint is deprecated. Use /realtime with API key."}), 410
 
 
+@app.cli.command('backfill-summaries')
+def backfill_summaries():
+    """Write summary fields for documents stored before they existed."""
+    for collection in (images_collection, realtime_images_collection):
+        updated = 0
+        ops = []
+        cursor = collection.find(
+            {"summary": {"$exists": False}},
+            {"annotations.annotations.score": 1, "annotations.annotations.class": 1,
+             "annotations.annotations.category_id": 1, "annotations.annotations.area": 1}
+        )
+        for doc in cursor:
+            summary = summarize_annotations(doc.get("annotations", {}).get("annotations", []))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"summary": summary}}))
+            if len(ops) >= 500:
+                updated += collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+        print(f"{collection.name}: backfilled {updated} documents")
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,82 @@
+import os
+import threading
+import collections
+import mimetypes
+from flask import request, send_file, abort
+from werkzeug.utils import safe_join
+from dedup import content_hash
+
+# Cache-Control for files that are written once and never modified in place
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Cache-Control for files that may be replaced under the same name: always revalidate
+REVALIDATE = 'no-cache'
+
+# Precompressed variants written next to JSON sidecars, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class _ETagCache:
+    """Content-hash ETags keyed by (path, mtime, size), so each file version is hashed once."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, st):
+        key = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+                return etag
+        etag = content_hash(path)
+        with self._lock:
+            self._entries[key] = etag
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+
+etag_cache = _ETagCache()
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def send_artefact(directory, filename, cache_control=REVALIDATE, precompressed=True):
+    """send_from_directory with content-hash ETags, Cache-Control and precompressed JSON.
+
+    Conditional requests are answered with 304 by Flask's send_file. For
+    ``.json`` files a ``.br`` or ``.gz`` sibling is served instead when the
+    client accepts that encoding, with ``Vary: Accept-Encoding``.
+    """
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = None
+    vary = precompressed and path.endswith('.json')
+    if vary:
+        for name, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix) and _accepts(name):
+                path, encoding = path + suffix, name
+                break
+
+    st = os.stat(path)
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=etag_cache.get(path, st),
+        last_modified=st.st_mtime,
+        max_age=None
+    )
+    response.headers['Cache-Control'] = cache_control
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if vary:
+        response.vary.add('Accept-Encoding')
+    return response
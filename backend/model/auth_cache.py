@@ -0,0 +1,61 @@
+import os
+import time
+import hmac
+import hashlib
+import threading
+
+
+class CredentialCache:
+    """TTL-bounded cache of credentials that have already been verified.
+
+    Only an HMAC of ``email:password`` under a per-process random key is kept,
+    never the password itself. Entries expire after ``ttl`` seconds, which also
+    bounds how long another worker process can keep accepting a changed
+    password; within this process ``invalidate`` takes effect immediately.
+    """
+
+    def __init__(self, ttl=300, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, email, password):
+        return hmac.new(self._key, f"{email}\0{password}".encode('utf-8'), hashlib.sha256).digest()
+
+    def check(self, email, password):
+        """Return True if these exact credentials were verified within the TTL."""
+        if not self.ttl:
+            return False
+        digest = self._digest(email, password)
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry and entry[1] > time.monotonic() and hmac.compare_digest(entry[0], digest):
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def store(self, email, password):
+        if not self.ttl:
+            return
+        digest = self._digest(email, password)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest ones
+                self._entries = {e: v for e, v in self._entries.items() if v[1] > now}
+                while len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[email] = (digest, now + self.ttl)
+
+    def invalidate(self, email=None):
+        """Forget one user's cached credentials, or everyone's."""
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(email, None)
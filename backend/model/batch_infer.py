@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# batch_infer.py
+#
+# Offline batch inference over directories and glob patterns, writing the
+# same _annotations.json sidecars as the web app and optionally loading the
+# results into MongoDB. Resumable: files listed in the manifest are skipped.
+#
+#   python batch_infer.py images/ "archive/**/*.tif" -o results --batch 16
+#
+# Outputs mirror each input's directory below its input root. With
+# --mongo-user the results are stored like /upload results instead: run from
+# the backend directory so originals are copied into uploads/ under a unique
+# name and annotated images and sidecars go to outputs/, where the app serves
+# them.
+#
+#   python batch_infer.py images/ --mongo-user user@example.com
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import rasterio
+from rasterio.errors import RasterioIOError
+from annotations import annotations_from_result, build_meta, summarize_annotations
+from bulk_upload import unique_name
+from model_backends import load_model
+from seg_codec import ENCODINGS, encode_meta
+from sidecar import SidecarWriter
+from tiling import should_tile, tiled_predict
+from overlay_renderer import render_overlay, save_image
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+WEIGHTS     = "best_landfill_seg.pt"
+CONF_THRESH = 0.25
+IOU_THRESH  = 0.45
+EXTENSIONS  = {'png', 'jpg', 'jpeg', 'tif', 'tiff'}
+MONGO_URI   = "mongodb://localhost:27017/"
+UPLOAD_FOLDER = "uploads"  # where the app serves originals from
+OUTPUT_DIR  = "outputs"    # where the app serves annotated images from
+TILE_SIZE   = 1024     # GeoTIFFs larger than this are run tile by tile
+TILE_OVERLAP = 128
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch YOLO segmentation over many images.")
+    parser.add_argument('inputs', nargs='+', help="directories, files or glob patterns")
+    parser.add_argument('-o', '--output', help="directory for sidecars (default: outputs)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="descend into input directories")
+    parser.add_argument('--batch', type=int, default=8, help="images per predict call")
+    parser.add_argument('--device', default='cpu', help="'cpu' or a CUDA device index")
+    parser.add_argument('--backend', default='torch', help="torch, onnx or openvino (see export_model.py)")
+    parser.add_argument('--precision', default='fp32', help="fp32 or int8")
+    parser.add_argument('--readers', type=int, default=4, help="image decoding threads")
+    parser.add_argument('--prefetch', type=int, default=4, help="batches decoded ahead of the model")
+    parser.add_argument('--segmentation', default='polygon', choices=ENCODINGS, help="stored segmentation encoding")
+    parser.add_argument('--annotated', choices=('jpg', 'webp', 'png'),
+                        help="also render annotated images (always on, default jpg, with --mongo-user)")
+    parser.add_argument('--manifest', help="completed-files manifest (default: <output>/batch_manifest.jsonl)")
+    parser.add_argument('--mongo-user', help="insert results into MongoDB for this user email")
+    args = parser.parse_args()
+    if args.mongo_user:
+        # Stored documents need an original and an annotated image the app can serve
+        args.output = args.output or OUTPUT_DIR
+        args.annotated = args.annotated or 'jpg'
+    args.output = args.output or 'outputs'
+    return args
+
+
+def _input_root(item):
+    """Directory that names below an input are made relative to: the non-glob prefix of a pattern."""
+    if os.path.isdir(item):
+        return item
+    parts = []
+    for part in item.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    root = os.sep.join(parts) if len(parts) < len(item.split(os.sep)) else os.path.dirname(item)
+    return root or '.'
+
+
+def collect_inputs(inputs, recursive):
+    """Expand directories and glob patterns into a sorted {image path: path relative to its input root}."""
+    paths = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            matches = glob.glob(pattern, recursive=recursive)
+        else:
+            matches = glob.glob(item, recursive=True)
+        root = os.path.abspath(_input_root(item))
+        for p in matches:
+            if os.path.isfile(p) and p.rsplit('.', 1)[-1].lower() in EXTENSIONS:
+                path = os.path.abspath(p)
+                paths.setdefault(path, os.path.relpath(path, root))
+    return dict(sorted(paths.items()))
+
+
+def load_manifest(path):
+    """(completed paths, {path: stored filename}) from a manifest.
+
+    Stored filenames are recorded when they are chosen, before the file is
+    done, so a resumed run reuses them instead of picking new ones.
+    """
+    done, filenames = set(), {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if "filename" in entry:
+                    filenames[entry["path"]] = entry["filename"]
+                if not entry.get("reserved"):
+                    done.add(entry["path"])
+    return done, filenames
+
+
+def georeference(path):
+    try:
+        with rasterio.open(path) as dataset:
+            return dataset.transform, dataset.transform.a
+    except RasterioIOError:
+        return None, 0.1
+
+
+def read_image(path):
+    return path, cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def prefetch_batches(paths, batch_size, readers, prefetch):
+    """Yield lists of (path, image) in input order, decoding up to ``prefetch`` batches ahead."""
+    with ThreadPoolExecutor(max_workers=readers, thread_name_prefix='reader') as pool:
+        pending = []
+        for start in range(0, len(paths), batch_size):
+            pending.append([pool.submit(read_image, p) for p in paths[start:start + batch_size]])
+            if len(pending) > prefetch:
+                yield [f.result() for f in pending.pop(0)]
+        for batch in pending:
+            yield [f.result() for f in batch]
+
+
+class _TileEngine:
+    """The engine interface tiled_predict needs, over the already loaded model."""
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+        self.names = model.names
+
+    def predict_many(self, sources, key=None):
+        return self.model.predict(source=sources, conf=CONF_THRESH, iou=IOU_THRESH, device=self.device,
+                                  verbose=False, save=False)
+
+
+class Results:
+    """Writes sidecars, annotated images, MongoDB documents and the manifest."""
+
+    def __init__(self, args, filenames):
+        self.args = args
+        self.sidecars = SidecarWriter(workers=2)
+        self.manifest = open(args.manifest, 'a')
+        self.collection = None
+        if args.mongo_user:
+            from pymongo import MongoClient
+            self.collection = MongoClient(MONGO_URI)['landfill_detection']['images']
+            # Documents are upserted per source file, so a resumed run never stores one twice
+            self.collection.create_index([("user_email", 1), ("source_path", 1)], sparse=True)
+            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        self._filenames = filenames     # stored filenames chosen by earlier runs
+        self._taken = set()
+        self._pending = []      # (manifest entry, sidecar future, mongo document)
+        self.processed = 0
+        self.failed = 0
+
+    def _names(self, path, rel):
+        """(stored filename, output path prefix) for one input."""
+        if self.collection is None:
+            # Mirror the input tree so equal basenames in different folders never collide
+            base, _ = os.path.splitext(rel)
+            out = os.path.join(self.args.output, base)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            return os.path.basename(path), out
+        # Like /upload: the original gets a unique name in uploads/ and outputs are named after it.
+        # The name is recorded before any output is written; the original is copied by flush().
+        filename = self._filenames.get(path)
+        if filename is None:
+            filename = unique_name(UPLOAD_FOLDER, os.path.basename(path), self._taken)
+            self._filenames[path] = filename
+            self.manifest.write(json.dumps({"path": path, "filename": filename, "reserved": True}) + "\n")
+            self.manifest.flush()
+        return filename, os.path.join(self.args.output, os.path.splitext(filename)[0])
+
+    def add(self, path, rel, meta, annotated=None):
+        meta = encode_meta(meta, self.args.segmentation)
+        filename, out = self._names(path, rel)
+        meta["image"] = filename
+        out_json = f"{out}_annotations.json"
+        out_img = None
+        if annotated is not None:
+            out_img = f"{out}_annotated.{self.args.annotated}"
+            save_image(out_img, annotated)
+        doc = None
+        if self.collection is not None:
+            doc = {
+                "user_email": self.args.mongo_user,
+                "source_path": path,
+                "filename": filename,
+                "original_path": os.path.join(UPLOAD_FOLDER, filename),
+                "annotated_path": out_img,
+                "annotations": meta,
+                "summary": summarize_annotations(meta.get("annotations", [])),
+                "processed_at": datetime.datetime.utcnow()
+            }
+        entry = {"path": path, "json": out_json, "filename": filename}
+        self._pending.append((entry, self.sidecars.write(out_json, meta), doc))
+        self.processed += 1
+
+    def fail(self, path, error):
+        print(f"⚠️  {path}: {error}", file=sys.stderr)
+        self.failed += 1
+
+    def flush(self):
+        """Wait for sidecars, upsert documents and copy originals, then record the files as done."""
+        if not self._pending:
+            return
+        for _, future, _ in self._pending:
+            future.result()
+        docs = [doc for _, _, doc in self._pending if doc is not None]
+        if docs:
+            from pymongo import UpdateOne
+            self.collection.bulk_write([
+                UpdateOne({"user_email": doc["user_email"], "source_path": doc["source_path"]},
+                          {"$set": doc}, upsert=True)
+                for doc in docs
+            ], ordered=False)
+            # Originals are copied only once their documents are stored; until then only the
+            # name reserved in the manifest exists, and a resumed run reuses it
+            for doc in docs:
+                shutil.copy(doc["source_path"], doc["original_path"])
+        # Recorded only after everything is written, so a resumed run never skips unsaved work
+        for entry, _, _ in self._pending:
+            self.manifest.write(json.dumps(entry) + "\n")
+        self.manifest.flush()
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self.manifest.close()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    args.manifest = args.manifest or os.path.join(args.output, 'batch_manifest.jsonl')
+    device = int(args.device) if args.device.isdigit() else args.device
+
+    paths = collect_inputs(args.inputs, args.recursive)
+    done, filenames = load_manifest(args.manifest)
+    todo = [p for p in paths if p not in done]
+    print(f"🔍 {len(paths)} images found, {len(paths) - len(todo)} already done, {len(todo)} to process")
+    if not todo:
+        return
+
+    model = load_model(WEIGHTS, args.backend, args.precision)
+    tile_engine = _TileEngine(model, device)
+    results = Results(args, filenames)
+
+    # GeoTIFFs larger than one tile go through windowed inference instead of the batch
+    tiled = {p for p in todo if should_tile(p, TILE_SIZE)}
+    regular = [p for p in todo if p not in tiled]
+
+    start = time.perf_counter()
+    try:
+        for path in sorted(tiled):
+            try:
+                meta, overview = tiled_predict(path, tile_engine, tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                                               batch_tiles=args.batch, iou_thresh=IOU_THRESH,
+                                               render=bool(args.annotated))
+                results.add(path, paths[path], meta, overview)
+            except Exception as e:
+                results.fail(path, e)
+            results.flush()
+
+        for batch in prefetch_batches(regular, args.batch, args.readers, args.prefetch):
+            for path, img in batch:
+                if img is None:
+                    results.fail(path, "unreadable image")
+            batch = [(p, img) for p, img in batch if img is not None]
+            if not batch:
+                continue
+            try:
+                outputs = model.predict(source=[img for _, img in batch], conf=CONF_THRESH, iou=IOU_THRESH,
+                                        device=device, verbose=False, save=False)
+            except Exception as e:
+                # Only this batch is lost; its files stay out of the manifest and are retried on resume
+                for path, _ in batch:
+                    results.fail(path, e)
+                continue
+            for (path, img), r in zip(batch, outputs):
+                try:
+                    transform, scaling_factor = georeference(path)
+                    annotations = annotations_from_result(r, model.names, transform, scaling_factor)
+                    meta = build_meta(path, r.orig_shape[1], r.orig_shape[0], model.names, annotations, scaling_factor)
+                    results.add(path, paths[path], meta, render_overlay(img, annotations) if args.annotated else None)
+                except Exception as e:
+                    results.fail(path, e)
+            # Checkpoint every batch so an interrupted run loses at most one batch
+            results.flush()
+
+            elapsed = time.perf_counter() - start
+            print(f"   {results.processed}/{len(todo)} images  {results.processed / elapsed:.2f} images/sec", end='\r')
+    finally:
+        results.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ {results.processed} images in {elapsed:.1f}s ({results.processed / max(elapsed, 1e-9):.2f} images/sec),"
+          f" {results.failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# bench_auth.py
+#
+# Measures per-request authentication latency with and without the
+# credential cache, and for signed bearer tokens:
+#
+#   python bench_auth.py user@example.com secret
+
+import sys
+import time
+import statistics
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+ITERATIONS = 2000      # verifications per mode
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.mean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[int(len(samples) * 0.99) - 1]
+    }
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("usage: bench_auth.py <email> <password>", file=sys.stderr)
+        sys.exit(1)
+    email, password = sys.argv[1], sys.argv[2]
+
+    import app
+    if app.verify_password(email, password) != email:
+        print("❌ Credentials rejected", file=sys.stderr)
+        sys.exit(1)
+
+    def uncached():
+        # Same code path as before the cache existed: one MongoDB lookup per request
+        app.credential_cache.invalidate(email)
+        app.verify_password(email, password)
+
+    token = app.token_serializer.dumps({"email": email})
+    results = {
+        "basic (no cache)": timed(uncached, ITERATIONS),
+        "basic (cached)": timed(lambda: app.verify_password(email, password), ITERATIONS),
+        "bearer token": timed(lambda: app.verify_token(token), ITERATIONS)
+    }
+
+    for mode, r in results.items():
+        print(f"{mode:18s} mean {r['mean_us']:9.1f} µs   p50 {r['p50_us']:9.1f} µs   p99 {r['p99_us']:9.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# bench_segmentation.py
+#
+# Size and speed of each segmentation encoding on real polygons, taken
+# from testing.json (or any _annotations.json files given):
+#
+#   python bench_segmentation.py
+#   python bench_segmentation.py outputs/*_annotations.json
+
+import sys
+import json
+import time
+from seg_codec import ENCODINGS, encode_segmentation, decode_segmentation
+
+try:
+    import bson
+except ImportError:  # pymongo's bson gives the stored document size when available
+    bson = None
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+TESTING_JSON = "testing.json"
+TOLERANCE    = 1.0     # Douglas-Peucker tolerance in pixels
+REPEAT       = 20      # serialisations timed per encoding
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def load_detections(paths):
+    """(polygons, height, width) per detection."""
+    detections = []
+    if not paths:
+        with open(TESTING_JSON) as f:
+            data = json.load(f)
+        sizes = {img["id"]: (img["height"], img["width"]) for img in data["images"]}
+        for ann in data["annotations"]:
+            detections.append((ann["segmentation"], *sizes[ann["image_id"]]))
+        return detections
+    for path in paths:
+        with open(path) as f:
+            meta = json.load(f)
+        for ann in meta["annotations"]:
+            detections.append((ann["segmentation"], meta["height"], meta["width"]))
+    return detections
+
+
+def main():
+    detections = load_detections(sys.argv[1:])
+    if not detections:
+        print("❌ No detections found", file=sys.stderr)
+        sys.exit(1)
+    print(f"{len(detections)} detections\n")
+    print(f"{'encoding':12s} {'JSON KB':>9s} {'BSON KB':>9s} {'ratio':>6s} {'encode ms':>10s} {'decode ms':>10s} {'dumps ms':>9s}")
+
+    baseline = None
+    for encoding in ENCODINGS:
+        start = time.perf_counter()
+        encoded = [encode_segmentation(polys, encoding, h, w, TOLERANCE) for polys, h, w in detections]
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for seg in encoded:
+            decode_segmentation(seg)
+        decode_ms = (time.perf_counter() - start) * 1000
+
+        doc = {"annotations": [{"segmentation": seg} for seg in encoded]}
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            payload = json.dumps(doc)
+        dumps_ms = (time.perf_counter() - start) * 1000 / REPEAT
+
+        json_kb = len(payload) / 1024
+        bson_kb = len(bson.encode(doc)) / 1024 if bson else float('nan')
+        baseline = baseline or json_kb
+        print(f"{encoding:12s} {json_kb:9.1f} {bson_kb:9.1f} {json_kb / baseline:6.2f} "
+              f"{encode_ms:10.1f} {decode_ms:10.1f} {dumps_ms:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
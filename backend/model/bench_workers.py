@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# bench_workers.py
+#
+# Measures images/sec through the inference pool with 1..N worker
+# processes, each pinned to its own cores:
+#
+#   python bench_workers.py images 4
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import cv2
+from inference_engine import InferenceEngine
+from inference_pool import InferencePool, PoolClient
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+WEIGHTS = "best_landfill_seg.pt"
+TORCH_THREADS = 1      # intra-op threads per worker
+MIN_IMAGES = 64        # images per measurement (the folder is repeated as needed)
+WARMUP = 2             # batches per worker before timing starts
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def load_images(folder):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if name.rsplit('.', 1)[-1].lower() in ('png', 'jpg', 'jpeg', 'tif', 'tiff'):
+            img = cv2.imread(os.path.join(folder, name), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append(img)
+    return images
+
+
+def measure(images, workers):
+    address = os.path.join(tempfile.mkdtemp(prefix='bench-pool-'), 'pool.sock')
+    authkey = os.urandom(32)
+    pool = InferencePool(WEIGHTS, authkey, address=address, workers=workers, torch_threads=TORCH_THREADS).start()
+    threading.Thread(target=pool.serve_forever, daemon=True).start()
+    try:
+        client = PoolClient(address, authkey)
+        # One image per batch so the scaling shown is across processes, not batch size
+        engine = InferenceEngine(WEIGHTS, max_batch_size=1, model=client, dispatchers=workers)
+        engine.predict_many(images[:1] * (WARMUP * workers))
+
+        start = time.perf_counter()
+        engine.predict_many(images)
+        elapsed = time.perf_counter() - start
+        return len(images) / elapsed
+    finally:
+        pool.close()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: bench_workers.py <image_dir> [max_workers]", file=sys.stderr)
+        sys.exit(1)
+    folder = sys.argv[1]
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1) // TORCH_THREADS
+
+    images = load_images(folder)
+    if not images:
+        print(f"❌ No images found in {folder}", file=sys.stderr)
+        sys.exit(1)
+    images = (images * (MIN_IMAGES // len(images) + 1))[:max(MIN_IMAGES, len(images))]
+
+    baseline = None
+    for workers in range(1, max(1, max_workers) + 1):
+        rate = measure(images, workers)
+        baseline = baseline or rate
+        print(f"{workers:2d} workers  {rate:8.2f} images/sec   speedup {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
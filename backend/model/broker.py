@@ -0,0 +1,108 @@
+import queue
+import threading
+import collections
+
+
+class Subscriber:
+    """A bounded event queue attached to one broker topic."""
+
+    def __init__(self, broker, topic, max_queue):
+        self._broker = broker
+        self.topic = topic
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def _offer(self, event):
+        """Queue an event without blocking; returns False if this subscriber is too slow."""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    def get(self, timeout=None):
+        """Return the (event_id, payload) pairs queued so far, waiting up to ``timeout``.
+
+        Returns None once the subscriber has been dropped for falling behind and
+        its remaining events have been drained.
+        """
+        events = []
+        try:
+            events.append(self._queue.get(timeout=timeout))
+            while True:
+                events.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not events and self.overflowed:
+            return None
+        return events
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+
+class EventBroker:
+    """In-process publish/subscribe hub for real-time detection events.
+
+    Publishers call ``publish`` once per event; every subscriber of the topic
+    receives it through its own bounded queue. A subscriber whose queue is
+    full is dropped rather than slowing the publisher down. Each topic keeps
+    the last ``buffer_size`` events in a ring buffer with increasing ids, so a
+    reconnecting client can replay what it missed.
+    """
+
+    def __init__(self, buffer_size=256, max_queue=64):
+        self.buffer_size = buffer_size
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._topics = {}
+
+    def _topic(self, topic):
+        state = self._topics.get(topic)
+        if state is None:
+            state = {"next_id": 1, "ring": collections.deque(maxlen=self.buffer_size), "subscribers": []}
+            self._topics[topic] = state
+        return state
+
+    def publish(self, topic, payload):
+        """Publish ``payload`` to ``topic`` and return its event id."""
+        with self._lock:
+            state = self._topic(topic)
+            event = (state["next_id"], payload)
+            state["next_id"] += 1
+            state["ring"].append(event)
+            state["subscribers"] = [s for s in state["subscribers"] if s._offer(event)]
+        return event[0]
+
+    def subscribe(self, topic, last_event_id=None, replay=True):
+        """Attach a subscriber, pre-loaded with buffered events newer than ``last_event_id``."""
+        sub = Subscriber(self, topic, self.max_queue + self.buffer_size)
+        with self._lock:
+            state = self._topic(topic)
+            if replay:
+                for event in state["ring"]:
+                    if last_event_id is None or event[0] > last_event_id:
+                        sub._offer(event)
+            state["subscribers"].append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            state = self._topics.get(sub.topic)
+            if state and sub in state["subscribers"]:
+                state["subscribers"].remove(sub)
+
+    def clear(self, topic):
+        """Forget the replay buffer of ``topic``, e.g. when a new session starts."""
+        with self._lock:
+            if topic in self._topics:
+                self._topics[topic]["ring"].clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                topic: {"subscribers": len(state["subscribers"]), "buffered": len(state["ring"]),
+                        "last_event_id": state["next_id"] - 1}
+                for topic, state in self._topics.items()
+            }
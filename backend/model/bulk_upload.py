@@ -0,0 +1,71 @@
+import os
+import shutil
+import tarfile
+import zipfile
+from sidecar import temp_path
+
+ZIP_EXTENSIONS = ('.zip',)
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+COPY_BUFFER = 1024 * 1024
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ZIP_EXTENSIONS + TAR_EXTENSIONS)
+
+
+def iter_entries(filename, stream):
+    """Yield (entry_name, fileobj) for an uploaded file or each regular file in an archive.
+
+    Tar archives are read in streaming mode, one member at a time. Zip needs
+    its central directory, so it reads from the upload's spooled temp file,
+    but each entry is still copied out in chunks rather than loaded whole.
+    """
+    lower = filename.lower()
+    if lower.endswith(TAR_EXTENSIONS):
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, archive.extractfile(member)
+    elif lower.endswith(ZIP_EXTENSIONS):
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as entry:
+                        yield info.filename, entry
+    else:
+        yield filename, stream
+
+
+def unique_name(directory, name, taken):
+    """``name`` made unique against files in ``directory`` and names in ``taken``.
+
+    The name is reserved by creating an empty file with O_EXCL, so concurrent
+    uploads (other threads or processes) never get the same one; the caller
+    then overwrites that file.
+    """
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while True:
+        if candidate not in taken:
+            try:
+                os.close(os.open(os.path.join(directory, candidate), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                break
+            except FileExistsError:
+                pass
+        candidate = f"{base}_{n}{ext}"
+        n += 1
+    taken.add(candidate)
+    return candidate
+
+
+def save_stream(fileobj, path):
+    """Copy ``fileobj`` to ``path`` in chunks, replacing it atomically."""
+    fd, tmp = temp_path(path)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(fileobj, out, COPY_BUFFER)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
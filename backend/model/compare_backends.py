@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# compare_backends.py
+#
+# Accuracy parity and CPU latency of exported models against the PyTorch
+# checkpoint, on the testing.json images found in IMAGES_DIR:
+#
+#   python compare_backends.py onnx onnx:int8 openvino
+#
+# Each backend is scored against testing.json ground truth and against the
+# torch predictions (same class, box IoU >= MATCH_IOU). Exits non-zero when a
+# backend agrees with torch on fewer than MIN_AGREEMENT of the detections.
+
+import os
+import sys
+import json
+import time
+import cv2
+from model_backends import load_model
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+WEIGHTS       = "best_landfill_seg.pt"
+TESTING_JSON  = "testing.json"
+IMAGES_DIR    = "images"
+MAX_IMAGES    = 200     # cap on images evaluated
+CONF_THRESH   = 0.25
+IOU_THRESH    = 0.45
+MATCH_IOU     = 0.5     # box IoU for two detections to count as the same object
+MIN_AGREEMENT = 0.95    # required F1 agreement with the torch predictions
+WARMUP        = 3
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def box_iou(a, b):
+    ix = min(a[2], b[2]) - max(a[0], b[0])
+    iy = min(a[3], b[3]) - max(a[1], b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(preds, truths):
+    """Greedy same-class matching by box IoU; returns (matched, mean IoU of matches)."""
+    used = set()
+    ious = []
+    for label, box, _ in sorted(preds, key=lambda p: p[2], reverse=True):
+        best, best_iou = None, MATCH_IOU
+        for j, (t_label, t_box, _) in enumerate(truths):
+            if j in used or t_label != label:
+                continue
+            iou = box_iou(box, t_box)
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            ious.append(best_iou)
+    return len(ious), (sum(ious) / len(ious) if ious else 0.0)
+
+
+def f1(matched, n_pred, n_true):
+    if n_pred == 0 and n_true == 0:
+        return 1.0
+    return 2 * matched / (n_pred + n_true)
+
+
+def load_ground_truth():
+    with open(TESTING_JSON) as f:
+        data = json.load(f)
+    names = {c["id"]: c["name"] for c in data["categories"]}
+    truths = {img["id"]: (img["file_name"], []) for img in data["images"]
+              if os.path.isfile(os.path.join(IMAGES_DIR, img["file_name"]))}
+    for ann in data["annotations"]:
+        if ann["image_id"] not in truths:
+            continue
+        for poly in ann["segmentation"]:
+            xs, ys = poly[0::2], poly[1::2]
+            truths[ann["image_id"]][1].append((names[ann["category_id"]], [min(xs), min(ys), max(xs), max(ys)], 1.0))
+    return list(truths.values())[:MAX_IMAGES]
+
+
+def run(spec, images):
+    backend, _, precision = spec.partition(':')
+    model = load_model(WEIGHTS, backend, precision or 'fp32')
+    for _ in range(WARMUP):
+        model.predict(source=images[0][1], conf=CONF_THRESH, iou=IOU_THRESH, device='cpu', verbose=False)
+
+    latencies, predictions = [], []
+    for _, img in images:
+        start = time.perf_counter()
+        r = model.predict(source=img, conf=CONF_THRESH, iou=IOU_THRESH, device='cpu', verbose=False)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append([
+            (r.names[int(c)], b, float(s))
+            for b, s, c in zip(r.boxes.xyxy.tolist(), r.boxes.conf.tolist(), r.boxes.cls.tolist())
+        ])
+    latencies.sort()
+    return predictions, {
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+
+def score(predictions, references):
+    matched = n_pred = n_ref = 0
+    ious = []
+    for preds, refs in zip(predictions, references):
+        m, iou = match(preds, refs)
+        matched, n_pred, n_ref = matched + m, n_pred + len(preds), n_ref + len(refs)
+        if m:
+            ious.append(iou)
+    return f1(matched, n_pred, n_ref), (sum(ious) / len(ious) if ious else 0.0)
+
+
+def main():
+    specs = ['torch'] + [s for s in sys.argv[1:] if s != 'torch']
+    truths = load_ground_truth()
+    if not truths:
+        print(f"❌ None of the {TESTING_JSON} images are in {IMAGES_DIR}", file=sys.stderr)
+        sys.exit(1)
+    images = [(name, cv2.imread(os.path.join(IMAGES_DIR, name))) for name, _ in truths]
+    ground_truth = [boxes for _, boxes in truths]
+    print(f"Evaluating {len(images)} images from {TESTING_JSON}\n")
+
+    reference, failed = None, False
+    print(f"{'backend':16s} {'GT F1':>7s} {'torch F1':>9s} {'box IoU':>8s} {'mean ms':>8s} {'p95 ms':>8s} {'speedup':>8s}")
+    for spec in specs:
+        try:
+            predictions, latency = run(spec, images)
+        except (FileNotFoundError, ValueError, ImportError) as e:
+            print(f"{spec:16s} skipped: {e}")
+            continue
+        gt_f1, _ = score(predictions, ground_truth)
+        if reference is None:
+            reference, base_latency = predictions, latency
+        agreement, iou = score(predictions, reference)
+        speedup = base_latency["mean_ms"] / latency["mean_ms"]
+        print(f"{spec:16s} {gt_f1:7.3f} {agreement:9.3f} {iou:8.3f} "
+              f"{latency['mean_ms']:8.1f} {latency['p95_ms']:8.1f} {speedup:7.2f}x")
+        if agreement < MIN_AGREEMENT:
+            failed = True
+
+    if failed:
+        print(f"\n❌ A backend agrees with torch on fewer than {MIN_AGREEMENT:.0%} of detections", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import json
+import hashlib
+import datetime
+
+
+def content_hash(path, chunk_size=1 << 20):
+    """128-bit BLAKE2b digest of a file's bytes, read in chunks."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def settings_fingerprint(weights, **settings):
+    """Short digest of the model weights and the settings that shape its results."""
+    h = hashlib.blake2b(digest_size=8)
+    h.update((content_hash(weights) if os.path.exists(weights) else weights).encode('utf-8'))
+    h.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Hard-link ``src`` to ``dst`` when possible, otherwise copy it."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+class DedupIndex:
+    """Content-addressed index of processed images stored in MongoDB.
+
+    Entries are keyed by the content hash as ``_id``, so lookups go through
+    the primary key index and stay O(1)-ish at any size. Each entry keeps the
+    annotations produced for that content and the annotated image it was
+    rendered to, so a duplicate upload under a new name can reuse both.
+
+    ``fingerprint`` identifies the model and settings that produced a result;
+    entries recorded under another fingerprint are never returned, and
+    ``purge_stale`` removes them.
+    """
+
+    def __init__(self, collection, fingerprint=None):
+        self.collection = collection
+        self.fingerprint = fingerprint
+
+    def ensure_indexes(self):
+        # _id already carries the unique hash index; these serve record() and purge_stale()
+        self.collection.create_index("annotated_path")
+        self.collection.create_index("fingerprint")
+
+    def purge_stale(self):
+        """Delete entries produced by another model or settings; returns how many."""
+        return self.collection.delete_many({"fingerprint": {"$ne": self.fingerprint}}).deleted_count
+
+    def lookup(self, digest):
+        """Return the stored entry for ``digest`` or None."""
+        return self.collection.find_one({"_id": digest, "fingerprint": self.fingerprint})
+
+    def record(self, digest, meta, annotated_path):
+        """Store (or refresh) the result for ``digest``.
+
+        Any other entry pointing at the same annotated file is dropped, since
+        that file has just been overwritten with this content's rendering.
+        """
+        self.collection.delete_many({"annotated_path": annotated_path, "_id": {"$ne": digest}})
+        self.collection.update_one(
+            {"_id": digest},
+            {"$set": {
+                "meta": meta,
+                "annotated_path": annotated_path,
+                "fingerprint": self.fingerprint,
+                "created_at": datetime.datetime.utcnow()
+            }},
+            upsert=True
+        )
@@ -0,0 +1,187 @@
+import os
+import math
+import glob
+import shutil
+import threading
+import collections
+import cv2
+import rasterio
+from rasterio.windows import Window
+from werkzeug.utils import safe_join
+from tiling import TILED_EXTENSIONS, _bands, _value_range, _to_bgr8
+from overlay_renderer import save_image
+
+
+class _GeoRaster:
+    """GeoTIFF source read with windowed, decimated rasterio reads."""
+
+    def __init__(self, path):
+        self.path = path
+        with rasterio.open(path) as dataset:
+            self.width, self.height = dataset.width, dataset.height
+            self._bands = _bands(dataset)
+            self._value_range = _value_range(dataset, self._bands)
+
+    def read(self, col, row, width, height, out_width, out_height):
+        with rasterio.open(self.path) as dataset:
+            data = dataset.read(
+                self._bands,
+                window=Window(col, row, width, height),
+                out_shape=(len(self._bands), out_height, out_width)
+            )
+        return _to_bgr8(data, self._value_range)
+
+
+class _ImageRaster:
+    """PNG/JPEG source decoded once and kept in memory while it is being browsed."""
+
+    def __init__(self, path):
+        self.image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if self.image is None:
+            raise ValueError(f"Could not read image: {path}")
+        self.height, self.width = self.image.shape[:2]
+
+    def read(self, col, row, width, height, out_width, out_height):
+        crop = self.image[row:row + height, col:col + width]
+        if (out_width, out_height) == (width, height):
+            return crop
+        return cv2.resize(crop, (out_width, out_height), interpolation=cv2.INTER_AREA)
+
+
+class DerivativeStore:
+    """Cached thumbnails and XYZ tile pyramids for images served from ``folders``.
+
+    Derivatives are generated on first request and written under
+    ``cache_dir/<folder>/<filename>-<mtime>-<size>/``, so a replaced source
+    gets fresh derivatives. Thumbnails come in fixed size buckets. Tiles
+    follow the XYZ scheme: zoom ``max_zoom`` is full resolution, each lower
+    zoom halves it, and edge tiles are cropped to the image like deep-zoom
+    tiles. GeoTIFF tiles are windowed reads, so a 20k-pixel orthophoto is
+    never decoded whole.
+    """
+
+    def __init__(self, cache_dir, folders, tile_size=256, thumb_sizes=(128, 256, 512, 1024), quality=80,
+                 fmt='jpg', open_rasters=4):
+        self.cache_dir = cache_dir
+        self.folders = folders
+        self.tile_size = tile_size
+        self.thumb_sizes = tuple(sorted(thumb_sizes))
+        self.quality = quality
+        self.fmt = fmt
+        self._rasters = collections.OrderedDict()
+        self._max_rasters = open_rasters
+        self._lock = threading.Lock()
+        self._inflight = {}     # output path -> lock held while it is generated
+
+    def source_path(self, folder, filename):
+        """Path of a servable source image; raises FileNotFoundError otherwise.
+
+        ``filename`` may name a file in a subdirectory of the folder (real-time
+        outputs are stored per session) but never one outside it.
+        """
+        directory = self.folders.get(folder)
+        path = safe_join(directory, filename) if directory else None
+        if not path or not os.path.isfile(path):
+            raise FileNotFoundError(f"{folder}/{filename}")
+        return path
+
+    def _cache_dir(self, folder, path):
+        st = os.stat(path)
+        name = os.path.relpath(path, self.folders[folder])
+        return os.path.join(self.cache_dir, folder, f"{name}-{st.st_mtime_ns:x}-{st.st_size:x}")
+
+    def _raster(self, path):
+        key = (path, os.stat(path).st_mtime_ns)
+        with self._lock:
+            raster = self._rasters.get(key)
+            if raster is not None:
+                self._rasters.move_to_end(key)
+                return raster
+        if path.rsplit('.', 1)[-1].lower() in TILED_EXTENSIONS:
+            raster = _GeoRaster(path)
+        else:
+            raster = _ImageRaster(path)
+        with self._lock:
+            self._rasters[key] = raster
+            while len(self._rasters) > self._max_rasters:
+                self._rasters.popitem(last=False)
+        return raster
+
+    def _generate(self, out, render):
+        """Write ``out`` with ``render()`` unless it exists; concurrent requests for it generate it once."""
+        with self._lock:
+            lock = self._inflight.setdefault(out, threading.Lock())
+        try:
+            with lock:
+                if not os.path.exists(out):
+                    os.makedirs(os.path.dirname(out), exist_ok=True)
+                    save_image(out, render(), self.quality)
+        finally:
+            with self._lock:
+                if self._inflight.get(out) is lock and not lock.locked():
+                    del self._inflight[out]
+
+    def bucket(self, size):
+        """Smallest thumbnail bucket that is at least ``size`` (the largest one otherwise)."""
+        for bucket in self.thumb_sizes:
+            if size <= bucket:
+                return bucket
+        return self.thumb_sizes[-1]
+
+    def max_zoom(self, width, height):
+        return max(0, math.ceil(math.log2(max(width, height) / self.tile_size)))
+
+    def info(self, folder, filename):
+        raster = self._raster(self.source_path(folder, filename))
+        return {
+            "width": raster.width,
+            "height": raster.height,
+            "tile_size": self.tile_size,
+            "min_zoom": 0,
+            "max_zoom": self.max_zoom(raster.width, raster.height),
+            "format": self.fmt
+        }
+
+    def thumbnail(self, folder, filename, size):
+        """Path of the cached thumbnail whose longest side is the bucket for ``size``."""
+        path = self.source_path(folder, filename)
+        bucket = self.bucket(size)
+        out = os.path.join(self._cache_dir(folder, path), f"thumb_{bucket}.{self.fmt}")
+        if not os.path.exists(out):
+            raster = self._raster(path)
+            scale = min(1.0, bucket / max(raster.width, raster.height))
+            out_w, out_h = max(1, round(raster.width * scale)), max(1, round(raster.height * scale))
+            self._generate(out, lambda: raster.read(0, 0, raster.width, raster.height, out_w, out_h))
+        return out
+
+    def tile(self, folder, filename, z, x, y):
+        """Path of the cached XYZ tile, or None when it lies outside the image."""
+        path = self.source_path(folder, filename)
+        out = os.path.join(self._cache_dir(folder, path), 'tiles', str(z), str(x), f"{y}.{self.fmt}")
+        if os.path.exists(out):
+            return out
+
+        raster = self._raster(path)
+        max_zoom = self.max_zoom(raster.width, raster.height)
+        if not 0 <= z <= max_zoom or x < 0 or y < 0:
+            return None
+        # Source pixels per tile pixel at this zoom
+        factor = 2 ** (max_zoom - z)
+        col, row = x * self.tile_size * factor, y * self.tile_size * factor
+        if col >= raster.width or row >= raster.height:
+            return None
+        width = min(self.tile_size * factor, raster.width - col)
+        height = min(self.tile_size * factor, raster.height - row)
+        out_w, out_h = max(1, math.ceil(width / factor)), max(1, math.ceil(height / factor))
+
+        self._generate(out, lambda: raster.read(col, row, width, height, out_w, out_h))
+        return out
+
+    def purge(self, folder, filename):
+        """Drop every cached derivative of a source file."""
+        prefix = safe_join(os.path.join(self.cache_dir, folder), filename)
+        if prefix is None:
+            return
+        pattern = f"{glob.escape(prefix)}-*"
+        for directory in glob.glob(pattern):
+            shutil.rmtree(directory, ignore_errors=True)
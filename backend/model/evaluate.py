@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# evaluate.py
+#
+# Accuracy and performance of the process_image inference path on testing.json:
+# COCO box/mask mAP per category (needs pycocotools), latency percentiles,
+# throughput and peak RSS, written to a JSON report:
+#
+#   python evaluate.py --label baseline
+#   python evaluate.py --backend onnx --precision int8 --label onnx-int8
+#   python evaluate.py --tile-size 512 --label tiled-512
+#   python evaluate.py --compare reports/eval-baseline-*.json reports/eval-onnx-int8-*.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from annotations import annotations_from_result, build_meta
+from inference_engine import InferenceEngine
+from model_backends import load_model
+from seg_codec import polygons_to_rle
+from tiling import tiled_predict
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+WEIGHTS      = "best_landfill_seg.pt"
+TESTING_JSON = "testing.json"
+IMAGES_DIR   = "images"
+REPORTS_DIR  = "reports"
+CONF_THRESH  = 0.25
+IOU_THRESH   = 0.45
+WARMUP       = 3
+PERCENTILES  = (50, 90, 95, 99)
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the segmentation model against testing.json.")
+    parser.add_argument('--label', default='run', help="name of this run in the report")
+    parser.add_argument('--backend', default='torch', help="torch, onnx or openvino")
+    parser.add_argument('--precision', default='fp32', help="fp32 or int8")
+    parser.add_argument('--conf', type=float, default=CONF_THRESH)
+    parser.add_argument('--iou', type=float, default=IOU_THRESH)
+    parser.add_argument('--batch', type=int, default=8, help="engine max batch size")
+    parser.add_argument('--concurrency', type=int, default=1, help="images in flight (1 = pure latency)")
+    parser.add_argument('--tile-size', type=int, default=0, help="run windowed inference with this tile size")
+    parser.add_argument('--tile-overlap', type=int, default=128)
+    parser.add_argument('--max-images', type=int, help="evaluate only the first N images")
+    parser.add_argument('-o', '--output', help="report path (default: reports/eval-<label>-<time>.json)")
+    parser.add_argument('--compare', nargs='+', metavar='REPORT', help="print a side-by-side table of reports")
+    return parser.parse_args()
+
+
+def polygon_area(poly):
+    """Shoelace area of a flat [x1, y1, x2, y2, ...] polygon."""
+    xs, ys = poly[0::2], poly[1::2]
+    return abs(sum(xs[i] * ys[i - 1] - xs[i - 1] * ys[i] for i in range(len(xs)))) / 2
+
+
+def load_dataset(max_images=None):
+    """testing.json restricted to images present in IMAGES_DIR, with the fields COCOeval needs."""
+    with open(TESTING_JSON) as f:
+        data = json.load(f)
+    images = [img for img in data["images"] if os.path.isfile(os.path.join(IMAGES_DIR, img["file_name"]))]
+    images = images[:max_images] if max_images else images
+    ids = {img["id"] for img in images}
+    annotations = []
+    for ann in data["annotations"]:
+        if ann["image_id"] not in ids:
+            continue
+        xs = [x for poly in ann["segmentation"] for x in poly[0::2]]
+        ys = [y for poly in ann["segmentation"] for y in poly[1::2]]
+        bbox = [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)]
+        annotations.append(dict(ann, bbox=ann.get("bbox", bbox), iscrowd=ann.get("iscrowd", 0),
+                                area=ann.get("area", sum(polygon_area(p) for p in ann["segmentation"]))))
+    return {"images": images, "annotations": annotations, "categories": data["categories"]}
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def make_predict(engine, args):
+    """The process_image inference step for one image path, returning its annotations meta."""
+    def predict(path):
+        if args.tile_size:
+            meta, _ = tiled_predict(path, engine, tile_size=args.tile_size, overlap=args.tile_overlap,
+                                    batch_tiles=args.batch, iou_thresh=args.iou)
+            return meta
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not read image: {path}")
+        r = engine.predict(image)
+        annotations = annotations_from_result(r, engine.names, None, 0.1)
+        return build_meta(path, r.orig_shape[1], r.orig_shape[0], engine.names, annotations, 0.1)
+    return predict
+
+
+def run_inference(dataset, args):
+    """Predict every image; returns ({image_id: meta}, per-image latencies in ms, wall seconds)."""
+    model = load_model(WEIGHTS, args.backend, args.precision)
+    engine = InferenceEngine(WEIGHTS, conf=args.conf, iou=args.iou, max_batch_size=args.batch, model=model)
+    predict = make_predict(engine, args)
+    paths = {img["id"]: os.path.join(IMAGES_DIR, img["file_name"]) for img in dataset["images"]}
+
+    for path in list(paths.values())[:WARMUP]:
+        predict(path)
+
+    def timed(item):
+        image_id, path = item
+        start = time.perf_counter()
+        meta = predict(path)
+        return image_id, meta, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        results = list(pool.map(timed, paths.items()))
+    wall = time.perf_counter() - start
+    return {i: meta for i, meta, _ in results}, sorted(ms for _, _, ms in results), wall
+
+
+def to_coco_results(metas, dataset):
+    """Predictions in COCO results format, matched to dataset categories by name.
+
+    Segmentations stay float polygons here; coco_map rasterises them the same
+    way as the ground truth.
+    """
+    by_name = {c["name"]: c["id"] for c in dataset["categories"]}
+    sizes = {img["id"]: (img["height"], img["width"]) for img in dataset["images"]}
+    results, unmatched = [], set()
+    for image_id, meta in metas.items():
+        height, width = sizes[image_id]
+        for ann in meta["annotations"]:
+            category_id = by_name.get(ann["class"])
+            if category_id is None:
+                unmatched.add(ann["class"])
+                continue
+            x1, y1, x2, y2 = ann["box"]
+            results.append({
+                "image_id": image_id,
+                "category_id": category_id,
+                "bbox": [x1, y1, x2 - x1, y2 - y1],
+                "score": float(ann["score"]),
+                "segmentation": [p for p in ann["segmentation"] if len(p) >= 6],
+                "size": (height, width)
+            })
+    return results, sorted(unmatched)
+
+
+def coco_map(dataset, results):
+    """{'bbox': {...}, 'segm': {...}} mAP summaries, or None without pycocotools."""
+    try:
+        from pycocotools.coco import COCO
+        from pycocotools.cocoeval import COCOeval
+        from pycocotools import mask as mask_utils
+    except ImportError:
+        print("⚠️  pycocotools is not installed; skipping mAP", file=sys.stderr)
+        return None
+
+    names = {c["id"]: c["name"] for c in dataset["categories"]}
+    results = [
+        dict(r, segmentation=mask_utils.merge(mask_utils.frPyObjects(r["segmentation"], *r["size"]))
+             if r["segmentation"] else polygons_to_rle([], *r["size"]))
+        for r in results
+    ]
+    summary = {}
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        gt = COCO()
+        gt.dataset = dataset
+        gt.createIndex()
+        dt = gt.loadRes(results) if results else None
+        for iou_type in ('bbox', 'segm'):
+            if dt is None:
+                summary[iou_type] = {"mAP": 0.0, "mAP50": 0.0, "mAP75": 0.0, "per_category": {}}
+                continue
+            ev = COCOeval(gt, dt, iou_type)
+            ev.evaluate()
+            ev.accumulate()
+            ev.summarize()
+            per_category = {}
+            for k, cat_id in enumerate(ev.params.catIds):
+                # IoU thresholds x recall, all areas, maxDets=100; -1 marks categories without ground truth
+                precision = ev.eval["precision"][:, :, k, 0, -1]
+                valid = precision[precision > -1]
+                if valid.size:
+                    per_category[names[cat_id]] = float(valid.mean())
+            summary[iou_type] = {
+                "mAP": float(ev.stats[0]),
+                "mAP50": float(ev.stats[1]),
+                "mAP75": float(ev.stats[2]),
+                "per_category": per_category
+            }
+    return summary
+
+
+def evaluate(args):
+    dataset = load_dataset(args.max_images)
+    if not dataset["images"]:
+        print(f"❌ None of the {TESTING_JSON} images are in {IMAGES_DIR}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Evaluating {len(dataset['images'])} images, {len(dataset['annotations'])} annotations")
+
+    metas, latencies, wall = run_inference(dataset, args)
+    results, unmatched = to_coco_results(metas, dataset)
+    if unmatched:
+        print(f"⚠️  Model classes not in {TESTING_JSON}: {', '.join(unmatched)}", file=sys.stderr)
+
+    report = {
+        "label": args.label,
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "config": {
+            "weights": WEIGHTS,
+            "backend": args.backend,
+            "precision": args.precision,
+            "conf": args.conf,
+            "iou": args.iou,
+            "batch": args.batch,
+            "concurrency": args.concurrency,
+            "tile_size": args.tile_size,
+            "tile_overlap": args.tile_overlap
+        },
+        "images": len(metas),
+        "detections": len(results),
+        "latency_ms": dict(
+            {"mean": sum(latencies) / len(latencies), "max": latencies[-1]},
+            **{f"p{p}": percentile(latencies, p) for p in PERCENTILES}
+        ),
+        "throughput_ips": len(metas) / wall,
+        "peak_rss_mb": peak_rss_mb(),
+        "coco": coco_map(dataset, results)
+    }
+
+    out = args.output or os.path.join(
+        REPORTS_DIR, f"eval-{args.label}-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table([report])
+    print(f"\n✅ Report saved to: {out}")
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'.rjust(len(format(0, spec)))
+
+
+def print_table(reports):
+    """One row per report; the last two columns are mAP deltas against the first report."""
+    def maps(report):
+        coco = report.get("coco") or {}
+        return (coco.get("bbox") or {}).get("mAP"), (coco.get("segm") or {}).get("mAP")
+
+    base_box, base_mask = maps(reports[0])
+    print(f"\n{'label':18s} {'backend':14s} {'conf':>5s} {'tile':>5s} {'box mAP':>8s} {'mask mAP':>9s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s} {'img/s':>7s} {'RSS MB':>7s} {'Δbox':>7s} {'Δmask':>7s}")
+    for report in reports:
+        cfg = report["config"]
+        box, mask = maps(report)
+        lat = report["latency_ms"]
+        print(f"{report['label'][:18]:18s} {cfg['backend'] + ':' + cfg['precision']:14s} {cfg['conf']:5.2f} "
+              f"{cfg['tile_size'] or '-':>5} {_fmt(box, '8.3f')} {_fmt(mask, '9.3f')} "
+              f"{lat['p50']:8.1f} {lat['p95']:8.1f} {report['throughput_ips']:7.2f} "
+              f"{_fmt(report['peak_rss_mb'], '7.0f')} "
+              f"{_fmt(box - base_box if None not in (box, base_box) else None, '+7.3f')} "
+              f"{_fmt(mask - base_mask if None not in (mask, base_mask) else None, '+7.3f')}")
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path) as f:
+                reports.append(json.load(f))
+        print_table(reports)
+    else:
+        evaluate(args)
+
+
+if __name__ == "__main__":
+    main()
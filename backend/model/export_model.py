@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# export_model.py
+#
+# Exports the segmentation checkpoint for a CPU runtime, next to the .pt:
+#
+#   python export_model.py onnx                 # best_landfill_seg.onnx
+#   python export_model.py onnx int8            # best_landfill_seg_int8.onnx, calibrated on testing.json
+#   python export_model.py openvino int8 data.yaml
+#
+# Then run the app with INFERENCE_BACKEND / INFERENCE_PRECISION set to match,
+# and check the export with compare_backends.py.
+
+import os
+import sys
+import json
+from model_backends import BACKENDS, PRECISIONS, export_model
+
+# ─── USER CONFIG ────────────────────────────────────────────────────────────
+WEIGHTS = "best_landfill_seg.pt"
+IMGSZ   = 640      # input size the model was trained at
+TESTING_JSON = "testing.json"
+IMAGES_DIR   = "images"
+CALIBRATION_IMAGES = 100   # ONNX INT8: testing.json images used to calibrate activations
+# ────────────────────────────────────────────────────────────────────────────
+
+
+def calibration_images():
+    """The first CALIBRATION_IMAGES testing.json images present in IMAGES_DIR."""
+    with open(TESTING_JSON) as f:
+        images = json.load(f)["images"]
+    paths = [os.path.join(IMAGES_DIR, img["file_name"]) for img in images]
+    return [p for p in paths if os.path.isfile(p)][:CALIBRATION_IMAGES]
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BACKENDS[1:]:
+        print(f"usage: export_model.py <{'|'.join(BACKENDS[1:])}> [{'|'.join(PRECISIONS)}] [data.yaml]",
+              file=sys.stderr)
+        sys.exit(1)
+    backend = sys.argv[1]
+    precision = sys.argv[2] if len(sys.argv) > 2 else 'fp32'
+    data = sys.argv[3] if len(sys.argv) > 3 else None
+
+    try:
+        calibration = calibration_images() if backend == 'onnx' and precision == 'int8' else None
+        path = export_model(WEIGHTS, backend, precision, imgsz=IMGSZ, data=data, calibration=calibration)
+    except (ValueError, ImportError, FileNotFoundError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Exported {backend} ({precision}) model to {path}")
+
+
+if __name__ == "__main__":
+    main()
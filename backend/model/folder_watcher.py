@@ -0,0 +1,190 @@
+import os
+import sys
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _inotify():
+    """Return a libc handle exposing inotify, or None where it is unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class Subscription:
+    """One consumer's view of a FolderWatcher: a queue of new filenames."""
+
+    def __init__(self, watcher):
+        self._watcher = watcher
+        self._queue = queue.Queue()
+
+    def _push(self, name):
+        self._queue.put(name)
+
+    def get(self, timeout=None):
+        """Return every filename queued so far, waiting up to ``timeout`` for the first."""
+        names = []
+        try:
+            names.append(self._queue.get(timeout=timeout))
+            while True:
+                names.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return names
+
+    def close(self):
+        self._watcher.unsubscribe(self)
+
+
+class FolderWatcher:
+    """Watches one directory and fans new-file events out to any number of subscribers.
+
+    On Linux the directory is watched with inotify and a file is reported once
+    it has been closed after writing or moved in. Elsewhere, or when inotify
+    cannot be set up, the directory is rescanned every ``poll_interval``
+    seconds. Either way each new file is reported once, however many
+    subscribers there are, and a file that is deleted and re-created is
+    reported again.
+    """
+
+    def __init__(self, directory, filter_fn=None, poll_interval=1.0):
+        self.directory = directory
+        self.filter_fn = filter_fn or (lambda name: True)
+        self.poll_interval = poll_interval
+        self._known = set()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.mode = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._known = set(self._scan())
+            self._thread = threading.Thread(target=self._run, name=f'watch-{self.directory}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        """Filenames currently known to be in the directory."""
+        with self._lock:
+            return sorted(self._known)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._known
+
+    def subscribe(self, include_existing=True):
+        """Register a subscriber, optionally primed with the files already present."""
+        sub = Subscription(self)
+        with self._lock:
+            if include_existing:
+                for name in sorted(self._known):
+                    sub._push(name)
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def _scan(self):
+        with os.scandir(self.directory) as it:
+            return [e.name for e in it if e.is_file() and self.filter_fn(e.name)]
+
+    def _added(self, name):
+        with self._lock:
+            if name in self._known:
+                return
+            self._known.add(name)
+            for sub in self._subscribers:
+                sub._push(name)
+
+    def _removed(self, name):
+        with self._lock:
+            self._known.discard(name)
+
+    def _resync(self):
+        """Diff a full rescan against the known set."""
+        try:
+            present = set(self._scan())
+        except OSError as e:
+            logger.error(f"Could not scan {self.directory}: {e}")
+            return
+        with self._lock:
+            gone = self._known - present
+        for name in gone:
+            self._removed(name)
+        for name in sorted(present):
+            self._added(name)
+
+    def _run(self):
+        libc = _inotify()
+        fd = -1
+        if libc is not None:
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+                os.close(fd)
+                fd = -1
+        if fd < 0:
+            self.mode = 'polling'
+            while not self._stop.wait(self.poll_interval):
+                self._resync()
+            return
+
+        self.mode = 'inotify'
+        # Catch anything written between the initial scan and the watch being added
+        self._resync()
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], self.poll_interval)
+                if ready:
+                    self._read_events(fd)
+        finally:
+            os.close(fd)
+
+    def _read_events(self, fd):
+        data = os.read(fd, 64 * 1024)
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._resync()
+            elif not name or not self.filter_fn(name):
+                continue
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._added(name)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._removed(name)
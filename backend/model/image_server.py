@@ -1,15 +1,24 @@
 import os
 import time
 import json
+import bisect
+import mimetypes
+import email.utils
+import urllib.parse
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
 import threading
+from folder_watcher import FolderWatcher
 
 # Configuration
 HOST = 'localhost'
 PORT = 8000
 IMAGE_DIR = r'C:\Placements\Projects\test_images'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'tif', 'tiff'}
+SCAN_INTERVAL = 1.0     # polling interval when inotify is unavailable
+RESYNC_INTERVAL = 30    # full rescan interval, picks up deletions
+MAX_LONG_POLL = 30      # upper bound for ?wait= on /images
+PAGE_LIMIT = 1000       # default number of entries per /images?since= page
 
 # Global variable to store the API key
 API_KEY = None
@@ -19,8 +28,116 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def parse_range(header, size):
+    """(start, end) for a single 'bytes=' range, None to serve the whole file.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        # Multi-range requests are answered with the full file, as RFC 7233 allows
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    if not first:
+        if not last or int(last) == 0:
+            raise ValueError(header)
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
 class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
-    pass
+    daemon_threads = True
+
+
+class ImageIndex:
+    """Arrival-ordered index of IMAGE_DIR that hands out monotonically increasing cursors.
+
+    Each file gets a cursor when the watcher first sees it (or sees it change).
+    Cursors start from max(mtime, ctime) in nanoseconds so they stay meaningful
+    across server restarts, and are bumped as needed to remain strictly
+    increasing. Clients pass the last cursor they saw to receive only newer files.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._cursors = []      # sorted cursor values, parallel to _names
+        self._names = []
+        self._known = {}        # filename -> (cursor, mtime_ns, size)
+        self._last_cursor = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_cursor(self):
+        with self._cond:
+            return self._last_cursor
+
+    def scan(self):
+        """Rescan the directory and index new, changed or removed files."""
+        found = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and allowed_file(entry.name):
+                    st = entry.stat()
+                    found[entry.name] = (max(st.st_mtime_ns, st.st_ctime_ns), st.st_mtime_ns, st.st_size)
+
+        with self._cond:
+            changed = [
+                (arrival, name) for name, (arrival, mtime_ns, size) in found.items()
+                if name not in self._known or self._known[name][1:] != (mtime_ns, size)
+            ]
+            removed = [name for name in self._known if name not in found]
+            if not changed and not removed:
+                return
+
+            stale = set(removed) | {name for _, name in changed if name in self._known}
+            if stale:
+                keep = [(c, n) for c, n in zip(self._cursors, self._names) if n not in stale]
+                self._cursors = [c for c, _ in keep]
+                self._names = [n for _, n in keep]
+                for name in stale:
+                    del self._known[name]
+
+            for arrival, name in sorted(changed):
+                cursor = max(self._last_cursor + 1, arrival)
+                self._last_cursor = cursor
+                self._cursors.append(cursor)
+                self._names.append(name)
+                _, mtime_ns, size = found[name]
+                self._known[name] = (cursor, mtime_ns, size)
+
+            if changed:
+                self._cond.notify_all()
+
+    def since(self, cursor, wait=0, limit=PAGE_LIMIT):
+        """Return (filenames, next_cursor, more) for files indexed after ``cursor``.
+
+        With ``wait`` > 0 the call blocks until something newer arrives or the
+        timeout expires, which lets clients long-poll instead of re-listing.
+        """
+        with self._cond:
+            if wait > 0:
+                self._cond.wait_for(lambda: self._last_cursor > cursor, timeout=wait)
+            start = bisect.bisect_right(self._cursors, cursor)
+            end = len(self._names) if limit is None else min(len(self._names), start + limit)
+            names = self._names[start:end]
+            next_cursor = self._cursors[end - 1] if end > start else max(cursor, 0)
+            return names, next_cursor, end < len(self._names)
+
+    def watch(self, watcher, resync_interval=RESYNC_INTERVAL):
+        """Rescan when the folder watcher reports new files, and periodically to catch deletions."""
+        subscription = watcher.subscribe(include_existing=False)
+        while True:
+            subscription.get(timeout=resync_interval)
+            try:
+                self.scan()
+            except OSError as e:
+                print(f"Index scan failed: {e}")
+
+
+image_index = ImageIndex(IMAGE_DIR)
 
 
 class ImageServerHandler(BaseHTTPRequestHandler):
@@ -34,30 +151,44 @@ class ImageServerHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps({"error": "Invalid or missing API key"}).encode('utf-8'))
             return
 
-        if self.path == '/images':
-            # Return list of image URLs
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path == '/images':
+            # Return image URLs, optionally only those newer than ?since=<cursor>
             try:
-                image_files = [
-                    f for f in os.listdir(IMAGE_DIR)
-                    if os.path.isfile(os.path.join(IMAGE_DIR, f)) and allowed_file(f)
-                ]
+                params = urllib.parse.parse_qs(parsed.query)
+                if 'since' in params:
+                    since = int(params['since'][0] or 0)
+                    wait = min(float(params.get('wait', ['0'])[0]), MAX_LONG_POLL)
+                    limit = int(params.get('limit', [PAGE_LIMIT])[0])
+                    image_files, cursor, more = image_index.since(since, wait=wait, limit=limit)
+                else:
+                    image_files, cursor, more = image_index.since(-1, limit=None)
                 image_urls = [
                     f'http://{HOST}:{PORT}/image/{f}' for f in image_files
                 ]
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
-                self.wfile.write(json.dumps({"images": image_urls}).encode('utf-8'))
+                self.wfile.write(json.dumps({
+                    "images": image_urls,
+                    "cursor": str(cursor),
+                    "more": more
+                }).encode('utf-8'))
+            except ValueError as e:
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode('utf-8'))
             except Exception as e:
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode('utf-8'))
-        elif self.path.startswith('/image/'):
+        elif parsed.path.startswith('/image/'):
             # Serve the image file
-            filename = self.path[len('/image/'):]
+            filename = os.path.basename(urllib.parse.unquote(parsed.path[len('/image/'):]))
             filepath = os.path.join(IMAGE_DIR, filename)
-            if not os.path.exists(filepath):
+            if not allowed_file(filename) or not os.path.isfile(filepath):
                 self.send_response(404)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
@@ -65,12 +196,10 @@ class ImageServerHandler(BaseHTTPRequestHandler):
                 return
 
             try:
-                with open(filepath, 'rb') as f:
-                    image_data = f.read()
-                self.send_response(200)
-                self.send_header('Content-Type', 'image/jpeg')  # Adjust based on file type if needed
-                self.end_headers()
-                self.wfile.write(image_data)
+                self.send_file(filepath)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client went away mid-transfer; it can resume with a Range request
+                pass
             except Exception as e:
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
@@ -82,8 +211,68 @@ class ImageServerHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Not found"}).encode('utf-8'))
 
+    def send_file(self, filepath):
+        """Stream a file with validators, answering conditional and Range requests."""
+        with open(filepath, 'rb') as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+            last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+
+            if self._not_modified(etag, st.st_mtime):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+
+            byte_range = None
+            if_range = self.headers.get('If-Range')
+            if not if_range or if_range in (etag, last_modified):
+                try:
+                    byte_range = parse_range(self.headers.get('Range'), size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = end - start + 1 if size else 0
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', mimetypes.guess_type(filepath)[0] or 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.end_headers()
+
+            if length:
+                # socket.sendfile uses os.sendfile where available and falls back to chunked send()
+                self.wfile.flush()
+                self.connection.sendfile(f, offset=start, count=length)
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
 
 def run_server():
+    image_index.scan()
+    watcher = FolderWatcher(IMAGE_DIR, allowed_file, poll_interval=SCAN_INTERVAL).start()
+    threading.Thread(target=image_index.watch, args=(watcher,), daemon=True).start()
     server = ThreadingHTTPServer((HOST, PORT), ImageServerHandler)
     print(f"Image server running on http://{HOST}:{PORT}")
     server.serve_forever()
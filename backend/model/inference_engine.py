@@ -0,0 +1,145 @@
+import time
+import threading
+import collections
+from concurrent.futures import Future
+from ultralytics import YOLO
+import cv2
+
+
+class InferenceEngine:
+    """Owns the YOLO model and runs pending predictions in micro-batches.
+
+    Callers submit an image path or BGR array and get back a Future that
+    resolves to the ultralytics Results object for that image only. A single
+    dispatcher thread drains the pending queue into batches of up to
+    ``max_batch_size`` and runs one ``predict`` per batch.
+
+    A lone request on an idle engine is dispatched immediately. The
+    ``max_wait_ms`` collection window is only opened when the previous batch
+    had more than one image, i.e. when there is real concurrency to exploit.
+
+    Requests carry an optional scheduling ``key`` (e.g. an ingestion session).
+    Pending work is kept in one FIFO per key and batches are filled
+    round-robin across keys, so a busy session cannot starve the others.
+
+    ``model`` replaces the in-process YOLO, e.g. with an inference_pool
+    PoolClient. Such a model can run several batches at once, so
+    ``dispatchers`` threads then each keep one batch in flight.
+    """
+
+    def __init__(self, weights, conf=0.25, iou=0.45, device='cpu', max_batch_size=8, max_wait_ms=10,
+                 model=None, dispatchers=1):
+        self.model = model if model is not None else YOLO(weights)
+        self.conf = conf
+        self.iou = iou
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self._cond = threading.Condition()
+        self._queues = collections.OrderedDict()   # key -> deque of (source, future)
+        self._pending = 0
+        self._last_batch_size = 0
+        self._stats_lock = threading.Lock()
+        self.stats = {"batches": 0, "images": 0, "max_batch": 0}
+        self._dispatchers = [
+            threading.Thread(target=self._run, name=f'inference-engine-{i}', daemon=True)
+            for i in range(max(1, int(dispatchers)))
+        ]
+        for thread in self._dispatchers:
+            thread.start()
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def submit(self, source, key=None):
+        """Queue one image (path or BGR array) and return a Future for its Results."""
+        if isinstance(source, str):
+            # Decode in the caller's thread so the dispatcher only runs the model
+            path = source
+            source = cv2.imread(path, cv2.IMREAD_COLOR)
+            if source is None:
+                raise ValueError(f"Could not read image: {path}")
+        future = Future()
+        with self._cond:
+            self._queues.setdefault(key, collections.deque()).append((source, future))
+            self._pending += 1
+            self._cond.notify()
+        return future
+
+    def predict(self, source, key=None):
+        """Run inference on a single image, blocking until its result is ready."""
+        return self.submit(source, key=key).result()
+
+    def predict_many(self, sources, key=None):
+        """Submit several images at once and return their Results in order."""
+        futures = [self.submit(src, key=key) for src in sources]
+        return [f.result() for f in futures]
+
+    def pending(self):
+        """Number of queued images per scheduling key."""
+        with self._cond:
+            return {key: len(q) for key, q in self._queues.items()}
+
+    def _take(self, limit):
+        """Pop up to ``limit`` requests round-robin across keys. Caller holds the lock."""
+        batch = []
+        while len(batch) < limit and self._pending:
+            key, q = next(iter(self._queues.items()))
+            batch.append(q.popleft())
+            self._pending -= 1
+            if q:
+                # Served once this round; go to the back of the line
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+        return batch
+
+    def _collect_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Take whatever is already waiting without blocking
+            batch = self._take(self.max_batch_size)
+
+            # Only hold the batch open when we have recently seen concurrent load
+            if len(batch) < self.max_batch_size and self.max_wait and self._last_batch_size > 1:
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                    batch += self._take(self.max_batch_size - len(batch))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Drop requests whose caller has already given up
+            batch = [(src, fut) for src, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._last_batch_size = len(batch)
+
+            try:
+                results = self.model.predict(
+                    source=[src for src, _ in batch],
+                    conf=self.conf,
+                    iou=self.iou,
+                    device=self.device,
+                    verbose=False,
+                    save=False
+                )
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            for (_, fut), r in zip(batch, results):
+                fut.set_result(r)
+
+            with self._stats_lock:
+                self.stats["batches"] += 1
+                self.stats["images"] += len(batch)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# inference_pool.py
+#
+# Standalone pool of YOLO inference processes that web workers submit to
+# over a local socket, so the number of model copies is fixed by the pool
+# size rather than by the number of gunicorn workers:
+#
+#   INFERENCE_POOL_AUTHKEY=<secret> INFERENCE_POOL_WORKERS=4 INFERENCE_POOL_THREADS=2 python inference_pool.py
+#
+# Opt-in: run it next to the web app and start the app with the same
+# INFERENCE_POOL_ADDRESS and INFERENCE_POOL_AUTHKEY. The authkey is required,
+# since the pool unpickles whatever authenticated clients send it.
+
+import os
+import sys
+import time
+import queue
+import itertools
+import threading
+import logging
+import multiprocessing
+from multiprocessing.connection import Listener, Client, wait
+from concurrent.futures import Future
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = 'localhost:6010'
+
+
+def parse_address(address):
+    """'host:port' for TCP, anything containing a '/' for a Unix socket path."""
+    if '/' in address:
+        return address
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def _compact(r):
+    """Picklable (orig_shape, xyxy, conf, cls, polygons) for one ultralytics Results."""
+    polys = None
+    if getattr(r, "masks", None) is not None:
+        polys = [np.asarray(p, dtype=np.float32) for p in r.masks.xy]
+    return (
+        tuple(r.orig_shape),
+        r.boxes.xyxy.cpu().numpy().astype(np.float32),
+        r.boxes.conf.cpu().numpy().astype(np.float32),
+        r.boxes.cls.cpu().numpy().astype(np.float32),
+        polys
+    )
+
+
+class _HostArray(np.ndarray):
+    """numpy array answering the ``.cpu().numpy()`` calls made on torch tensors."""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy.view(_HostArray)
+        self.conf = conf.view(_HostArray)
+        self.cls = cls.view(_HostArray)
+
+
+class _Masks:
+    def __init__(self, xy):
+        self.xy = xy
+
+
+class PoolResult:
+    """The parts of an ultralytics Results object the app reads, rebuilt client-side."""
+
+    def __init__(self, payload, names, image):
+        orig_shape, xyxy, conf, cls, polys = payload
+        self.orig_shape = orig_shape
+        self.boxes = _Boxes(xyxy, conf, cls)
+        self.masks = _Masks(polys) if polys is not None else None
+        self.names = names
+        self._image = image
+
+    def plot(self, alpha=0.3):
+        """Draw masks, boxes and labels on a copy of the submitted image."""
+        img = self._image.copy()
+        overlay = img.copy()
+        for poly in (self.masks.xy if self.masks is not None else []):
+            if len(poly) >= 3:
+                cv2.fillPoly(overlay, [np.round(poly).astype(np.int32).reshape(-1, 1, 2)], color=(0, 0, 255))
+        for (x1, y1, x2, y2), score, cid in zip(self.boxes.xyxy, self.boxes.conf, self.boxes.cls):
+            p1 = (int(x1), int(y1))
+            cv2.rectangle(img, p1, (int(x2), int(y2)), (0, 255, 0), 2)
+            cv2.putText(img, f'{self.names[int(cid)]} {float(score):.2f}', (p1[0], p1[1] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2, cv2.LINE_AA)
+        cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
+        return img
+
+
+def _worker_main(worker_id, weights, backend, precision, cores, torch_threads, tasks, results):
+    """Body of one pool process: pin, load the model once, then serve batches.
+
+    The OpenMP/BLAS thread counts come from the environment inherited from
+    InferencePool.start, since numpy and cv2 are already imported by now.
+    """
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    from model_backends import load_model
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(torch_threads)
+    model = load_model(weights, backend, precision)
+    results.put(('ready', worker_id, dict(model.names)))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, images, conf, iou = task
+        try:
+            out = model.predict(source=images, conf=conf, iou=iou, device='cpu', verbose=False, save=False)
+            results.put(('result', worker_id, task_id, True, [_compact(r) for r in out]))
+        except Exception as e:
+            results.put(('result', worker_id, task_id, False, f"{type(e).__name__}: {e}"))
+
+
+class InferencePool:
+    """Serves batched predictions from ``workers`` processes, each with one model copy.
+
+    Worker ``i`` is pinned to its own ``torch_threads`` cores (wrapping
+    around the cores available to this process) and limited to as many
+    intra-op threads, so N workers use N * torch_threads cores and hold
+    exactly N models. Clients connect
+    over ``multiprocessing.connection``; their batches go into one backlog
+    and a dispatcher hands the next batch to whichever worker is idle,
+    recording which worker holds which batch.
+    """
+
+    def __init__(self, weights, authkey, address=DEFAULT_ADDRESS, workers=None,
+                 torch_threads=1, pin_cores=True, backend='torch', precision='fp32'):
+        if not authkey:
+            raise ValueError("The inference pool needs an authkey; connections are unpickled")
+        self.weights = weights
+        self.backend = backend
+        self.precision = precision
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey = authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+        self.torch_threads = max(1, int(torch_threads))
+        self.workers = workers or max(1, (os.cpu_count() or 1) // self.torch_threads)
+        self.pin_cores = pin_cores
+        self.names = None
+        self._ctx = multiprocessing.get_context('spawn')
+        self._backlog = queue.Queue(maxsize=self.workers * 2)
+        self._results = self._ctx.Queue()
+        self._processes = {}
+        self._worker_tasks = {}     # worker id -> that worker's own task queue
+        self._idle = set()
+        self._running = {}          # worker id -> task id dispatched to it
+        self._state = threading.Condition()
+        self._routes = {}
+        self._routes_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._listener = None
+        self._closing = threading.Event()
+
+    def _cores(self):
+        if hasattr(os, 'sched_getaffinity'):
+            return sorted(os.sched_getaffinity(0))
+        return list(range(os.cpu_count() or 1))
+
+    def _spawn(self, worker_id):
+        cores = None
+        if self.pin_cores:
+            available = self._cores()
+            first = worker_id * self.torch_threads
+            cores = {available[(first + i) % len(available)] for i in range(self.torch_threads)}
+        # A fresh queue, so nothing sent to a dead worker reaches its replacement
+        tasks = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.weights, self.backend, self.precision, cores, self.torch_threads,
+                  tasks, self._results),
+            name=f'inference-{worker_id}',
+            daemon=True
+        )
+        proc.start()
+        self._worker_tasks[worker_id] = tasks
+        self._processes[worker_id] = proc
+
+    def start(self, poll=1.0):
+        """Start the worker processes and wait until every model is loaded.
+
+        The listener is bound first: clients connecting meanwhile wait in its
+        backlog and get their hello once the pool is ready. Raises
+        RuntimeError if a worker exits while loading its model.
+        """
+        self._listener = Listener(self.address, authkey=self.authkey)
+        # Spawned workers import numpy and cv2 with this module, sizing their thread
+        # pools from the environment before _worker_main runs; they inherit it from here
+        for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[var] = str(self.torch_threads)
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        while len(self._idle) < self.workers:
+            try:
+                message = self._results.get(timeout=poll)
+            except queue.Empty:
+                dead = [(i, p.exitcode) for i, p in self._processes.items() if not p.is_alive()]
+                if dead:
+                    self.close(timeout=0)
+                    raise RuntimeError(f"Inference worker {dead[0][0]} exited ({dead[0][1]}) "
+                                       f"while loading {self.weights}")
+                continue
+            if message[0] == 'ready':
+                self.names = message[2]
+                self._idle.add(message[1])
+        threading.Thread(target=self._dispatch, name='pool-dispatch', daemon=True).start()
+        threading.Thread(target=self._route_results, name='pool-results', daemon=True).start()
+        threading.Thread(target=self._monitor, name='pool-monitor', daemon=True).start()
+        logger.info(f"Inference pool: {self.workers} workers x {self.torch_threads} threads on {self.address}")
+        return self
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                if self._closing.is_set():
+                    return
+                # Failed handshakes (wrong authkey, port scans) must not stop the pool
+                logger.warning(f"Rejected inference client: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name='pool-client', daemon=True).start()
+
+    def close(self, timeout=10):
+        """Stop accepting clients and let every worker exit after its current batch."""
+        self._closing.set()
+        if self._listener is not None:
+            self._listener.close()
+        for tasks in self._worker_tasks.values():
+            tasks.put(None)
+        for proc in self._processes.values():
+            proc.join(timeout)
+            if proc.is_alive() and not timeout:
+                proc.terminate()
+
+    def _serve(self, conn):
+        send_lock = threading.Lock()
+        conn.send({"workers": self.workers, "names": self.names})
+        try:
+            while True:
+                req_id, images, conf, iou = conn.recv()
+                task_id = next(self._task_ids)
+                with self._routes_lock:
+                    self._routes[task_id] = (conn, send_lock, req_id)
+                # Blocks when every worker is busy and the backlog is full
+                self._backlog.put((task_id, images, conf, iou))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._routes_lock:
+                for task_id in [t for t, route in self._routes.items() if route[0] is conn]:
+                    del self._routes[task_id]
+            conn.close()
+
+    def _dispatch(self):
+        """Hand each backlog batch to an idle worker, remembering which one has it."""
+        while True:
+            task = self._backlog.get()
+            with self._state:
+                while not self._idle:
+                    self._state.wait()
+                worker_id = self._idle.pop()
+                self._running[worker_id] = task[0]
+                self._worker_tasks[worker_id].put(task)
+
+    def _reply(self, task_id, ok, payload):
+        with self._routes_lock:
+            route = self._routes.pop(task_id, None)
+        if route is None:
+            return
+        conn, send_lock, req_id = route
+        try:
+            with send_lock:
+                conn.send((req_id, ok, payload))
+        except (OSError, ValueError):
+            # Client went away while its batch was running
+            pass
+
+    def _route_results(self):
+        while True:
+            message = self._results.get()
+            with self._state:
+                if message[0] == 'ready':
+                    self._idle.add(message[1])
+                    self._state.notify()
+                    continue
+                _, worker_id, task_id, ok, payload = message
+                # A dead worker's late result must not free its replacement
+                if self._running.get(worker_id) == task_id:
+                    del self._running[worker_id]
+                    self._idle.add(worker_id)
+                    self._state.notify()
+            self._reply(task_id, ok, payload)
+
+    def _monitor(self, interval=2.0):
+        """Replace workers as soon as they die, failing the batch each one was running."""
+        while not self._closing.is_set():
+            sentinels = {proc.sentinel: worker_id for worker_id, proc in self._processes.items()}
+            for sentinel in wait(list(sentinels), timeout=interval):
+                if self._closing.is_set():
+                    return
+                worker_id = sentinels[sentinel]
+                proc = self._processes[worker_id]
+                proc.join()     # reaps it, so exitcode is set
+                logger.error(f"Inference worker {worker_id} exited ({proc.exitcode}); restarting")
+                with self._state:
+                    self._idle.discard(worker_id)
+                    task_id = self._running.pop(worker_id, None)
+                    self._spawn(worker_id)
+                if task_id is not None:
+                    self._reply(task_id, False, f"Inference worker {worker_id} died while running this batch")
+
+
+class PoolClient:
+    """Model stand-in that sends batches to an InferencePool.
+
+    It exposes ``names`` and ``predict(source=[...], conf=, iou=)`` like a
+    YOLO model, so InferenceEngine batches for it unchanged. One connection
+    is shared by all threads of the web worker; requests are multiplexed by
+    id. The connection is opened on first use and re-established after the
+    pool restarts, retrying with backoff for up to ``timeout`` seconds so web
+    workers can boot before the pool is up.
+    """
+
+    def __init__(self, address, authkey, timeout=120, max_backoff=8.0):
+        if not authkey:
+            raise ValueError("The inference pool client needs the pool's authkey")
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey = authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.workers = None
+        self._names = None
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pending = {}
+        self._req_ids = itertools.count()
+
+    @property
+    def names(self):
+        if self._names is None:
+            with self._lock:
+                self._ensure_connected()
+        return self._names
+
+    def _ensure_connected(self):
+        """Connect unless connected; call with ``_lock`` held."""
+        if self._conn is not None:
+            return
+        deadline = time.monotonic() + self.timeout
+        delay = 0.25
+        while True:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+                break
+            except OSError as e:
+                if time.monotonic() + delay > deadline:
+                    raise ConnectionError(f"Inference pool at {self.address} is unreachable: {e}") from e
+                logger.warning(f"Inference pool at {self.address} not reachable ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        hello = conn.recv()
+        self.workers = hello["workers"]
+        self._names = hello["names"]
+        self._conn = conn
+        threading.Thread(target=self._read, args=(conn,), name='pool-client-reader', daemon=True).start()
+
+    def _read(self, conn):
+        try:
+            while True:
+                req_id, ok, payload = conn.recv()
+                future = self._pending.pop(req_id, None)
+                if future is None:
+                    continue
+                if ok:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload))
+        except (EOFError, OSError):
+            pass
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            failed = list(self._pending.values())
+            self._pending.clear()
+        for future in failed:
+            if not future.done():
+                future.set_exception(ConnectionError("Inference pool connection lost"))
+
+    def predict(self, source, conf=0.25, iou=0.45, **kwargs):
+        """Run one batch on the pool; extra YOLO keyword arguments are ignored."""
+        images = list(source)
+        future = Future()
+        with self._lock:
+            self._ensure_connected()
+            req_id = next(self._req_ids)
+            self._pending[req_id] = future
+            self._conn.send((req_id, images, conf, iou))
+        try:
+            payloads = future.result(timeout=self.timeout)
+        finally:
+            self._pending.pop(req_id, None)
+        return [PoolResult(p, self.names, img) for p, img in zip(payloads, images)]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    authkey = os.getenv('INFERENCE_POOL_AUTHKEY')
+    if not authkey:
+        print("❌ Set INFERENCE_POOL_AUTHKEY to a secret shared with the web workers", file=sys.stderr)
+        sys.exit(1)
+    pool = InferencePool(
+        os.getenv('WEIGHTS', 'best_landfill_seg.pt'),
+        authkey,
+        address=os.getenv('INFERENCE_POOL_ADDRESS', DEFAULT_ADDRESS),
+        workers=int(os.getenv('INFERENCE_POOL_WORKERS', 0)) or None,
+        torch_threads=int(os.getenv('INFERENCE_POOL_THREADS', 1)),
+        pin_cores=os.getenv('INFERENCE_POOL_PIN', '1') == '1',
+        backend=os.getenv('INFERENCE_BACKEND', 'torch'),
+        precision=os.getenv('INFERENCE_PRECISION', 'fp32')
+    )
+    try:
+        pool.start().serve_forever()
+    except KeyboardInterrupt:
+        pool.close()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
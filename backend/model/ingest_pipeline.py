@@ -0,0 +1,339 @@
+import os
+import time
+import queue
+import threading
+import logging
+import collections
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# How often blocked stages wake up to check for a stop request
+STOP_POLL = 0.5
+# Attempts per download; later attempts resume the partial file with a Range request
+DOWNLOAD_ATTEMPTS = 3
+# Times a file goes through the pipeline before it is given up; retries wait for the next poll
+FILE_ATTEMPTS = 3
+
+
+class StageCounter:
+    """Thread-safe completed/failed counters for one pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def record(self, elapsed, ok=True):
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.busy_seconds += elapsed
+
+    def snapshot(self, wall_seconds):
+        with self._lock:
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "per_second": self.completed / wall_seconds if wall_seconds > 0 else 0.0,
+                "busy_seconds": round(self.busy_seconds, 3)
+            }
+
+
+class CursorBatch:
+    """Files from one listing page; its cursor is committed once all are settled."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        # The lister holds one reference until it has queued the whole page
+        self.remaining = 1
+
+
+class IngestTask:
+    """One listed file on its way through the stages."""
+
+    def __init__(self, filename, image_url, batch):
+        self.filename = filename
+        self.image_url = image_url
+        self.batch = batch
+        self.attempts = 0
+
+
+class IngestPipeline:
+    """Staged download -> inference -> write pipeline for the image server feed.
+
+    A lister polls the image server and feeds a pool of downloaders sharing
+    one pooled HTTP session. Downloaded files go through a bounded queue to
+    the inference workers, whose results go through another bounded queue to
+    a single writer. Full queues block the stage upstream, so a slow model
+    throttles downloads instead of filling the disk.
+
+    ``process_fn(path)`` runs inference and returns whatever ``save_fn``
+    needs; ``save_fn(filename, result)`` persists it. Setting ``stop_event``
+    stops every stage within about STOP_POLL seconds.
+
+    When the image server supports change feeds, the lister long-polls
+    ``?since=<cursor>`` and only sees new files. ``cursor`` resumes from a
+    previously saved position and ``on_cursor(cursor)`` is called once every
+    file up to that cursor has been written or given up, so a restart never
+    skips unfinished work. A file that fails in any stage is queued again on
+    the next poll, up to FILE_ATTEMPTS times, and holds back its page's
+    cursor until then.
+    """
+
+    def __init__(self, list_url, api_key, download_dir, process_fn, save_fn, stop_event,
+                 allowed_fn=None, downloaders=4, inference_workers=2, queue_size=16, poll_interval=5,
+                 cursor=None, on_cursor=None):
+        self.list_url = list_url
+        self.api_key = api_key
+        self.download_dir = download_dir
+        self.process_fn = process_fn
+        self.save_fn = save_fn
+        self.stop_event = stop_event
+        self.allowed_fn = allowed_fn or (lambda filename: True)
+        self.downloaders = max(1, downloaders)
+        self.inference_workers = max(1, inference_workers)
+        self.poll_interval = poll_interval
+        self.cursor = cursor
+        self.on_cursor = on_cursor
+
+        self.session = requests.Session()
+        self.session.headers['X-API-Key'] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.downloaders + 1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.download_queue = queue.Queue(maxsize=queue_size)
+        self.inference_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+
+        self._seen = set()
+        self._seen_lock = threading.Lock()
+        self._batches = collections.deque()
+        self._batches_lock = threading.Lock()
+        self._retries = collections.deque()     # failed tasks waiting for the next poll
+        self.counters = {
+            "list": StageCounter(),
+            "download": StageCounter(),
+            "inference": StageCounter(),
+            "write": StageCounter()
+        }
+        self.started_at = None
+        self._threads = []
+
+    def stats(self):
+        """Per-stage throughput counters plus current queue depths."""
+        wall = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "uptime_seconds": round(wall, 3),
+            "stages": {name: c.snapshot(wall) for name, c in self.counters.items()},
+            "queues": {
+                "download": self.download_queue.qsize(),
+                "inference": self.inference_queue.qsize(),
+                "write": self.write_queue.qsize(),
+                "retry": len(self._retries)
+            }
+        }
+
+    def run(self):
+        """Start every stage and block until the stop event is set."""
+        self.started_at = time.monotonic()
+        # The lister may be parked in a long-poll; it is a daemon and is not joined
+        threading.Thread(target=self._list_loop, name='ingest-list', daemon=True).start()
+        for i in range(self.downloaders):
+            self._spawn(self._download_loop, f'ingest-download-{i}')
+        for i in range(self.inference_workers):
+            self._spawn(self._inference_loop, f'ingest-infer-{i}')
+        self._spawn(self._write_loop, 'ingest-write')
+
+        self.stop_event.wait()
+        for t in self._threads:
+            t.join()
+        self.session.close()
+
+    def _spawn(self, target, name):
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _put(self, q, item):
+        """Blocking put that gives up when the pipeline is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=STOP_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=STOP_POLL)
+            except queue.Empty:
+                continue
+        return None
+
+    def _forget(self, filename):
+        """Allow a failed file to be picked up again on the next full listing."""
+        with self._seen_lock:
+            self._seen.discard(filename)
+
+    def _settle(self, batch):
+        """Mark one file of ``batch`` finished and commit any fully settled cursors."""
+        committed = None
+        with self._batches_lock:
+            batch.remaining -= 1
+            while self._batches and self._batches[0].remaining <= 0:
+                committed = self._batches.popleft().cursor
+        if committed is not None and self.on_cursor:
+            try:
+                self.on_cursor(committed)
+            except Exception as e:
+                logger.error(f"Error saving ingest cursor: {e}")
+
+    def _fail(self, stage, task, start):
+        """Queue a failed file for the next poll, or give it up after FILE_ATTEMPTS."""
+        self.counters[stage].record(time.monotonic() - start, ok=False)
+        task.attempts += 1
+        if task.attempts < FILE_ATTEMPTS:
+            self._retries.append(task)
+            return
+        logger.error(f"Giving up on {task.filename} after {task.attempts} attempts")
+        self._forget(task.filename)
+        self._settle(task.batch)
+
+    def _queue_retries(self):
+        """Put files that failed since the last poll back into the download queue."""
+        for _ in range(len(self._retries)):
+            task = self._retries.popleft()
+            logger.info(f"Retrying {task.filename} (attempt {task.attempts + 1} of {FILE_ATTEMPTS})")
+            if not self._put(self.download_queue, task):
+                return False
+        return True
+
+    def _list_loop(self):
+        # Start in change-feed mode; fall back to full listings if the server has no cursor
+        use_cursor = True
+        while not self.stop_event.is_set():
+            if not self._queue_retries():
+                return
+            start = time.monotonic()
+            params = {'since': self.cursor or 0, 'wait': self.poll_interval} if use_cursor else None
+            try:
+                response = self.session.get(self.list_url, params=params, timeout=self.poll_interval + 10)
+                response.raise_for_status()
+                payload = response.json()
+                self.counters["list"].record(time.monotonic() - start)
+            except (requests.RequestException, ValueError) as e:
+                logger.error(f"Error fetching images from server: {e}")
+                self.counters["list"].record(time.monotonic() - start, ok=False)
+                self.stop_event.wait(self.poll_interval)
+                continue
+
+            next_cursor = payload.get('cursor')
+            use_cursor = next_cursor is not None
+            batch = CursorBatch(next_cursor)
+            with self._batches_lock:
+                self._batches.append(batch)
+
+            for image_url in payload.get('images', []):
+                filename = os.path.basename(urllib.parse.urlparse(image_url).path)
+                if not self.allowed_fn(filename):
+                    continue
+                with self._seen_lock:
+                    if filename in self._seen:
+                        continue
+                    self._seen.add(filename)
+                with self._batches_lock:
+                    batch.remaining += 1
+                if not self._put(self.download_queue, IngestTask(filename, image_url, batch)):
+                    return
+
+            self._settle(batch)
+            if use_cursor:
+                self.cursor = next_cursor
+            else:
+                self.stop_event.wait(self.poll_interval)
+
+    def _download_loop(self):
+        while True:
+            task = self._get(self.download_queue)
+            if task is None:
+                return
+            start = time.monotonic()
+            file_path = os.path.join(self.download_dir, task.filename)
+            try:
+                self._fetch(task.image_url, file_path)
+            except (requests.RequestException, OSError) as e:
+                logger.error(f"Error downloading {task.image_url}: {e}")
+                self._fail("download", task, start)
+                continue
+            self.counters["download"].record(time.monotonic() - start)
+            if not self._put(self.inference_queue, (task, file_path)):
+                return
+
+    def _fetch(self, image_url, file_path):
+        """Download to a .part file, resuming after dropped connections, then move it into place."""
+        part = f"{file_path}.part"
+        etag = None
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            offset = os.path.getsize(part) if etag and os.path.exists(part) else 0
+            # If-Range makes the server send the whole file again if it changed meanwhile
+            headers = {'Range': f'bytes={offset}-', 'If-Range': etag} if offset else {}
+            try:
+                with self.session.get(image_url, headers=headers, timeout=10, stream=True) as response:
+                    response.raise_for_status()
+                    etag = response.headers.get('ETag')
+                    expected = int(response.headers.get('Content-Length', -1))
+                    received = 0
+                    with open(part, 'ab' if response.status_code == 206 else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            f.write(chunk)
+                            received += len(chunk)
+                    if expected >= 0 and received != expected:
+                        raise requests.exceptions.ChunkedEncodingError(f"got {received} of {expected} bytes")
+                os.replace(part, file_path)
+                return
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == DOWNLOAD_ATTEMPTS - 1 or self.stop_event.is_set():
+                    raise
+                logger.warning(f"Download of {image_url} interrupted, resuming: {e}")
+
+    def _inference_loop(self):
+        while True:
+            item = self._get(self.inference_queue)
+            if item is None:
+                return
+            task, file_path = item
+            start = time.monotonic()
+            try:
+                result = self.process_fn(file_path)
+            except Exception as e:
+                logger.error(f"Error processing {task.filename}: {e}")
+                self._fail("inference", task, start)
+                continue
+            self.counters["inference"].record(time.monotonic() - start)
+            if not self._put(self.write_queue, (task, result)):
+                return
+
+    def _write_loop(self):
+        while True:
+            item = self._get(self.write_queue)
+            if item is None:
+                return
+            task, result = item
+            start = time.monotonic()
+            try:
+                self.save_fn(task.filename, result)
+            except Exception as e:
+                logger.error(f"Error saving {task.filename}: {e}")
+                self._fail("write", task, start)
+                continue
+            self.counters["write"].record(time.monotonic() - start)
+            self._settle(task.batch)
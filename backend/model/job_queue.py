@@ -0,0 +1,198 @@
+import datetime
+import threading
+import logging
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+class JobQueue:
+    """MongoDB-backed work queue with priorities, retries and leases.
+
+    Jobs are documents in ``collection``, so they survive restarts and can be
+    shared by several web processes: a worker claims the highest-priority
+    queued job with one atomic ``find_one_and_update`` and holds a lease on it
+    that a heartbeat keeps extending while ``handler(job, progress)`` runs. A
+    job whose lease runs out (its process died) is queued again, unless that
+    was its last attempt. Failed jobs are retried with exponential backoff up
+    to ``max_attempts`` times.
+    """
+
+    def __init__(self, collection, handler, workers=2, max_attempts=3, lease_seconds=300, poll_interval=1.0):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = datetime.timedelta(seconds=lease_seconds)
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def ensure_indexes(self):
+        # Claim order: status filter, then highest priority, oldest first
+        self.collection.create_index([
+            ("status", ASCENDING), ("priority", DESCENDING), ("created_at", ASCENDING)
+        ])
+        self.collection.create_index([("user_email", ASCENDING), ("created_at", DESCENDING)])
+
+    def start(self):
+        self.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def enqueue(self, kind, payload, user_email, priority=0):
+        """Queue a job and return its id as a string."""
+        now = _now()
+        job_id = self.collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "user_email": user_email,
+            "status": QUEUED,
+            "priority": int(priority),
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "progress": {"stage": QUEUED, "percent": 0},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "available_at": now
+        }).inserted_id
+        self._wakeup.set()
+        return str(job_id)
+
+    def get(self, job_id, user_email=None):
+        """Return the job document, or None for unknown ids or another user's job."""
+        try:
+            query = {"_id": ObjectId(job_id)}
+        except (InvalidId, TypeError):
+            return None
+        if user_email is not None:
+            query["user_email"] = user_email
+        return self.collection.find_one(query)
+
+    def recover(self):
+        """Requeue running jobs whose lease has expired; returns how many.
+
+        A job that has used up its attempts is failed instead, so a job that
+        keeps killing its worker process (say, out of memory) stops coming back.
+        """
+        now = _now()
+        expired = {"status": RUNNING, "lease_until": {"$lt": now}}
+        failed = self.collection.update_many(
+            dict(expired, **{"$expr": {"$gte": ["$attempts", "$max_attempts"]}}),
+            {"$set": {"status": FAILED, "error": "Worker died while running the job", "finished_at": now,
+                      "updated_at": now, "progress": {"stage": FAILED, "percent": 100}}}
+        )
+        if failed.modified_count:
+            logger.error(f"Failed {failed.modified_count} jobs whose last attempt's lease expired")
+        result = self.collection.update_many(
+            dict(expired, **{"$expr": {"$lt": ["$attempts", "$max_attempts"]}}),
+            {"$set": {"status": QUEUED, "available_at": now, "updated_at": now,
+                      "progress": {"stage": QUEUED, "percent": 0}}}
+        )
+        if result.modified_count:
+            logger.warning(f"Requeued {result.modified_count} jobs with expired leases")
+        return result.modified_count
+
+    def _claim(self):
+        now = _now()
+        return self.collection.find_one_and_update(
+            {"status": QUEUED, "available_at": {"$lte": now}},
+            {
+                "$set": {"status": RUNNING, "lease_until": now + self.lease, "started_at": now, "updated_at": now,
+                         "progress": {"stage": RUNNING, "percent": 0}},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("priority", DESCENDING), ("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _update(self, job, fields):
+        fields["updated_at"] = _now()
+        # Only the lease holder may write; a requeued job belongs to someone else now
+        self.collection.update_one({"_id": job["_id"], "status": RUNNING, "attempts": job["attempts"]},
+                                   {"$set": fields})
+
+    def _heartbeat(self, job, done):
+        while not done.wait(self.lease.total_seconds() / 3):
+            self._update(job, {"lease_until": _now() + self.lease})
+
+    def _work(self):
+        last_recover = _now()
+        while not self._stop.is_set():
+            if _now() - last_recover > self.lease:
+                self.recover()
+                last_recover = _now()
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job, done), daemon=True).start()
+
+        def progress(stage, percent):
+            self._update(job, {"progress": {"stage": stage, "percent": percent}})
+
+        try:
+            result = self.handler(job, progress)
+        except Exception as e:
+            done.set()
+            logger.error(f"Job {job['_id']} failed (attempt {job['attempts']}): {e}")
+            if job["attempts"] < job["max_attempts"]:
+                retry_at = _now() + datetime.timedelta(seconds=2 ** job["attempts"])
+                self._update(job, {"status": QUEUED, "available_at": retry_at, "error": str(e),
+                                   "progress": {"stage": "retrying", "percent": 0}})
+                self._wakeup.set()
+            else:
+                self._update(job, {"status": FAILED, "error": str(e), "finished_at": _now(),
+                                   "progress": {"stage": FAILED, "percent": 100}})
+            return
+
+        done.set()
+        self._update(job, {"status": DONE, "result": result, "error": None, "finished_at": _now(),
+                           "progress": {"stage": DONE, "percent": 100}})
+
+
+def job_status(job):
+    """Public JSON view of a job document."""
+    return {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat()
+    }
@@ -0,0 +1,133 @@
+import os
+import shutil
+import logging
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+# 'torch' runs the .pt checkpoint; the others run an export of it through ultralytics
+BACKENDS = ('torch', 'onnx', 'openvino')
+PRECISIONS = ('fp32', 'int8')
+
+
+def exported_path(weights, backend, precision='fp32'):
+    """Where the export of ``weights`` for a backend/precision lives, next to the checkpoint."""
+    base, _ = os.path.splitext(weights)
+    suffix = '' if precision == 'fp32' else f'_{precision}'
+    if backend == 'torch':
+        return weights
+    if backend == 'onnx':
+        return f"{base}{suffix}.onnx"
+    if backend == 'openvino':
+        return f"{base}{suffix}_openvino_model"
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def _check(backend, precision):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    if backend == 'torch' and precision != 'fp32':
+        raise ValueError("The torch backend only runs fp32; export to onnx or openvino for int8")
+
+
+def _letterbox(img, imgsz):
+    """NCHW float32 input for one BGR image, resized and padded like the ultralytics predictor."""
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = round(h * r), round(w * r)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255
+
+
+class _CalibrationReader:
+    """onnxruntime calibration data reader feeding images one at a time."""
+
+    def __init__(self, input_name, images, imgsz):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._paths = iter(images)
+
+    def get_next(self):
+        for path in self._paths:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is not None:
+                return {self.input_name: _letterbox(img, self.imgsz)}
+        return None
+
+
+def export_model(weights, backend, precision='fp32', imgsz=640, data=None, calibration=None):
+    """Export ``weights`` for ``backend`` and return the exported model path.
+
+    ONNX INT8 statically quantises the fp32 export, calibrating activation
+    ranges on the image paths in ``calibration``. OpenVINO INT8 is calibrated
+    by ultralytics and needs a dataset YAML in ``data``. Either can lose
+    accuracy; check the export with evaluate.py before deploying it.
+    """
+    _check(backend, precision)
+    target = exported_path(weights, backend, precision)
+    if backend == 'torch':
+        return target
+
+    if backend == 'onnx' and precision == 'int8':
+        if not calibration:
+            raise ValueError("ONNX INT8 export needs calibration images (calibration=[...])")
+        import onnxruntime
+        from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+        source = export_model(weights, 'onnx', 'fp32', imgsz=imgsz)
+        input_name = onnxruntime.InferenceSession(source, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        quantize_static(
+            source,
+            target,
+            _CalibrationReader(input_name, calibration, imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8
+        )
+        return target
+
+    if backend == 'openvino' and precision == 'int8' and not data:
+        raise ValueError("OpenVINO INT8 export needs a calibration dataset YAML (data=...)")
+
+    # Exports are written next to the checkpoint under ultralytics' own naming
+    produced = YOLO(weights).export(
+        format=backend,
+        imgsz=imgsz,
+        int8=precision == 'int8',
+        data=data,
+        dynamic=backend == 'onnx',
+        simplify=backend == 'onnx'
+    )
+    produced = str(produced)
+    if os.path.abspath(produced) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        shutil.move(produced, target)
+    return target
+
+
+def load_model(weights, backend='torch', precision='fp32', auto_export=False):
+    """Return a YOLO model for ``weights`` on the configured backend.
+
+    Exported models go through the same ultralytics predictor, so callers get
+    the same Results objects (boxes, masks, classes) whatever the backend.
+    Missing exports are created on the fly only with ``auto_export``;
+    otherwise run export_model.py once at deploy time.
+    """
+    _check(backend, precision)
+    path = exported_path(weights, backend, precision)
+    if not os.path.exists(path):
+        if not auto_export:
+            raise FileNotFoundError(
+                f"No {backend} {precision} export at {path}; run: "
+                f"python export_model.py {backend} {precision}"
+            )
+        logger.info(f"Exporting {weights} to {backend} ({precision})")
+        path = export_model(weights, backend, precision)
+    return YOLO(path, task='segment')
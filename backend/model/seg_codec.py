@@ -0,0 +1,126 @@
+import numpy as np
+import cv2
+from pycocotools import mask as mask_utils
+
+# 'polygon': float pixel polygons as produced by the model (the original format)
+# 'simplified': polygons reduced with Douglas-Peucker at ``tolerance`` pixels
+# 'int': simplified polygons with coordinates rounded to whole pixels
+# 'rle': COCO compressed RLE of the mask, {"size": [h, w], "counts": "..."}
+ENCODINGS = ('polygon', 'simplified', 'int', 'rle')
+
+
+def simplify_polygon(poly, tolerance):
+    """Douglas-Peucker on a flat [x1, y1, x2, y2, ...] polygon; keeps at least a triangle."""
+    pts = np.asarray(poly, dtype=np.float32).reshape(-1, 1, 2)
+    if tolerance <= 0 or len(pts) <= 3:
+        return pts.reshape(-1)
+    approx = cv2.approxPolyDP(pts, tolerance, True)
+    return (approx if len(approx) >= 3 else pts).reshape(-1)
+
+
+def _rle_string(counts):
+    """COCO's LEB128-style string encoding of run lengths (see pycocotools maskApi.c)."""
+    out = []
+    for i, value in enumerate(counts):
+        x = int(value)
+        if i > 2:
+            x -= int(counts[i - 2])
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = (x != -1) if (c & 0x10) else (x != 0)
+            if more:
+                c |= 0x20
+            out.append(chr(c + 48))
+    return ''.join(out)
+
+
+def _rle_counts(s):
+    counts = []
+    p = 0
+    while p < len(s):
+        x = k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1f) << (5 * k)
+            more = bool(c & 0x20)
+            p += 1
+            k += 1
+            if not more and (c & 0x10):
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def polygons_to_rle(polys, height, width):
+    """COCO RLE (column-major runs, starting with zeros) of the union of ``polys``."""
+    polys = [p for p in polys if len(p) >= 6]
+    if not polys:
+        return {"size": [height, width], "counts": _rle_string([height * width])}
+    rle = mask_utils.merge(mask_utils.frPyObjects(polys, height, width))
+    return {"size": [height, width], "counts": rle["counts"].decode('ascii')}
+
+
+def rle_to_polygons(rle):
+    """Outer contours of an RLE mask as flat float polygons."""
+    height, width = rle["size"]
+    counts = _rle_counts(rle["counts"]) if isinstance(rle["counts"], str) else list(rle["counts"])
+    ends = np.cumsum(counts)
+    starts = ends - np.asarray(counts)
+    ones = [(s, e) for i, (s, e) in enumerate(zip(starts, ends)) if i % 2 == 1 and e > s]
+    if not ones:
+        return []
+    x0 = int(ones[0][0] // height)
+    x1 = int((ones[-1][1] - 1) // height) + 1
+    flat = np.zeros((x1 - x0) * height, dtype=np.uint8)
+    offset = x0 * height
+    for s, e in ones:
+        flat[s - offset:e - offset] = 1
+    mask = np.ascontiguousarray(flat.reshape(x1 - x0, height).T)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [(c.reshape(-1, 2) + [x0, 0]).astype(np.float32).reshape(-1).tolist() for c in contours if len(c) >= 3]
+
+
+def encode_segmentation(polys, encoding, height, width, tolerance=1.0):
+    """Encode one detection's list of flat polygons."""
+    if encoding == 'polygon':
+        return polys
+    if encoding == 'simplified':
+        return [[round(float(v), 1) for v in simplify_polygon(p, tolerance)] for p in polys]
+    if encoding == 'int':
+        return [np.round(simplify_polygon(p, tolerance)).astype(int).tolist() for p in polys]
+    if encoding == 'rle':
+        return polygons_to_rle(polys, height, width)
+    raise ValueError(f"Unknown segmentation encoding: {encoding}")
+
+
+def decode_segmentation(segmentation):
+    """Any stored segmentation back to the list-of-flat-polygons format."""
+    if isinstance(segmentation, dict):
+        return rle_to_polygons(segmentation)
+    return segmentation or []
+
+
+def encode_meta(meta, encoding, tolerance=1.0):
+    """Re-encode every segmentation in an annotations document, in place."""
+    if encoding == 'polygon':
+        return meta
+    for ann in meta["annotations"]:
+        ann["segmentation"] = encode_segmentation(ann.get("segmentation", []), encoding,
+                                                  meta["height"], meta["width"], tolerance)
+    meta["segmentation_encoding"] = encoding
+    return meta
+
+
+def polygon_meta(meta):
+    """Copy of an annotations document with polygon segmentations, whatever it was stored as."""
+    if meta.get("segmentation_encoding", 'polygon') == 'polygon':
+        return meta
+    annotations = [dict(ann, segmentation=decode_segmentation(ann.get("segmentation"))) for ann in meta["annotations"]]
+    out = dict(meta, annotations=annotations)
+    out.pop("segmentation_encoding", None)
+    return out
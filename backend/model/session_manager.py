@@ -0,0 +1,124 @@
+import os
+import hashlib
+import datetime
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _short_hash(value, length):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:length]
+
+
+class IngestSession:
+    """One real-time ingestion loop for a (user, API key) pair."""
+
+    def __init__(self, session_id, user_email, api_key, working_dir):
+        self.id = session_id
+        self.user_email = user_email
+        self.api_key = api_key
+        self.working_dir = working_dir
+        self.started_at = datetime.datetime.utcnow()
+        self.stop_event = threading.Event()
+        self.pipeline = None
+        self.thread = None
+        self.error = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def status(self):
+        return {
+            "id": self.id,
+            "user_email": self.user_email,
+            "isRunning": self.is_running(),
+            "started_at": self.started_at.isoformat(),
+            "error": self.error,
+            "pipeline": self.pipeline.stats() if self.pipeline else None
+        }
+
+
+class SessionManager:
+    """Runs any number of concurrent ingestion sessions, one per (user, API key).
+
+    Each session gets its own working directory under ``base_dir``, its own
+    stop handle and its own thread running ``run_fn(session)``, which is
+    expected to block until ``session.stop_event`` is set. Session ids are
+    ``<user hash>-<key hash>`` so neither the email nor the key appears in
+    paths, and a user's directories can be found by prefix after a restart.
+    """
+
+    def __init__(self, base_dir, run_fn):
+        self.base_dir = base_dir
+        self.run_fn = run_fn
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def user_prefix(user_email):
+        return _short_hash(user_email, 12)
+
+    @classmethod
+    def session_id(cls, user_email, api_key):
+        return f"{cls.user_prefix(user_email)}-{_short_hash(api_key, 8)}"
+
+    def get(self, user_email, api_key):
+        with self._lock:
+            return self._sessions.get(self.session_id(user_email, api_key))
+
+    def start(self, user_email, api_key):
+        """Start a session, or return the running one; returns (session, created)."""
+        session_id = self.session_id(user_email, api_key)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and session.is_running():
+                return session, False
+
+            working_dir = os.path.join(self.base_dir, session_id)
+            os.makedirs(working_dir, exist_ok=True)
+            # A new session starts from an empty working directory
+            for name in os.listdir(working_dir):
+                path = os.path.join(working_dir, name)
+                if os.path.isfile(path):
+                    os.remove(path)
+
+            session = IngestSession(session_id, user_email, api_key, working_dir)
+            session.thread = threading.Thread(target=self._run, args=(session,), name=f'ingest-{session_id}', daemon=True)
+            self._sessions[session_id] = session
+            session.thread.start()
+            return session, True
+
+    def _run(self, session):
+        try:
+            self.run_fn(session)
+        except Exception as e:
+            session.error = str(e)
+            logger.error(f"Ingestion session {session.id} failed: {e}")
+
+    def stop(self, user_email, api_key):
+        """Stop a running session; returns False if there was none."""
+        session = self.get(user_email, api_key)
+        if not session or not session.is_running():
+            return False
+        session.stop()
+        return True
+
+    def sessions(self, user_email=None):
+        with self._lock:
+            return [s for s in self._sessions.values() if user_email is None or s.user_email == user_email]
+
+    def working_dirs(self, user_email):
+        """Working directories on disk for this user, including ones from before a restart."""
+        prefix = self.user_prefix(user_email) + '-'
+        if not os.path.isdir(self.base_dir):
+            return []
+        return [
+            os.path.join(self.base_dir, name) for name in sorted(os.listdir(self.base_dir))
+            if name.startswith(prefix) and os.path.isdir(os.path.join(self.base_dir, name))
+        ]
@@ -0,0 +1,84 @@
+import os
+import json
+import gzip
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # optional, json with compact separators is the fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, only needed for brotli_copy
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_json(meta):
+    """Compact UTF-8 JSON bytes for an annotations document."""
+    if orjson is not None:
+        return orjson.dumps(meta)
+    return json.dumps(meta, separators=(',', ':')).encode('utf-8')
+
+
+def temp_path(path):
+    """Create a uniquely named temp file next to ``path``; returns (fd, temp path).
+
+    Concurrent writers of the same path each get their own file, so their
+    renames cannot collide.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    # mkstemp creates 0600 files; artefacts are read by other processes too
+    os.chmod(tmp, 0o644)
+    return fd, tmp
+
+
+def atomic_write(path, data):
+    """Write ``data`` to ``path`` through a unique temp file and an atomic rename."""
+    fd, tmp = temp_path(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class SidecarWriter:
+    """Writes _annotations.json sidecars on a background thread.
+
+    The processing path hands over the in-memory meta dict and moves on; the
+    file is encoded compactly and replaced atomically, so readers never see a
+    partial file. With ``gzip_copy`` / ``brotli_copy`` a ``.json.gz`` /
+    ``.json.br`` variant is written next to it for clients that accept
+    compressed responses.
+    """
+
+    def __init__(self, workers=1, gzip_copy=False, brotli_copy=False):
+        if brotli_copy and brotli is None:
+            logger.warning("brotli is not installed; skipping .br sidecars")
+        self.gzip_copy = gzip_copy
+        self.brotli_copy = brotli_copy and brotli is not None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sidecar')
+
+    def write(self, path, meta):
+        """Schedule ``meta`` to be written to ``path``; returns a Future."""
+        return self._executor.submit(self._write, path, meta)
+
+    def _write(self, path, meta):
+        try:
+            data = encode_json(meta)
+            atomic_write(path, data)
+            if self.gzip_copy:
+                atomic_write(f"{path}.gz", gzip.compress(data, compresslevel=6))
+            if self.brotli_copy:
+                atomic_write(f"{path}.br", brotli.compress(data, quality=9))
+        except Exception as e:
+            logger.error(f"Error writing sidecar {path}: {e}")
+            raise
@@ -0,0 +1,26 @@
+import json
+import os
+import numpy as np
+from pycocotools import mask as mask_utils
+import seg_codec
+
+TESTING_JSON = os.path.join(os.path.dirname(__file__), "testing.json")
+
+
+def test_empty_mask_matches_pycocotools():
+    empty = mask_utils.encode(np.zeros((10, 12, 1), dtype=np.uint8, order="F"))[0]["counts"].decode("ascii")
+    assert seg_codec.polygons_to_rle([], 10, 12)["counts"] == empty
+    # Degenerate polygons are dropped like an empty list
+    assert seg_codec.polygons_to_rle([[1, 2, 3, 4]], 10, 12)["counts"] == empty
+
+
+def test_rle_string_codec_round_trips_pycocotools_counts():
+    with open(TESTING_JSON) as f:
+        data = json.load(f)
+    sizes = {img["id"]: (img["height"], img["width"]) for img in data["images"]}
+    for ann in data["annotations"]:
+        height, width = sizes[ann["image_id"]]
+        counts = seg_codec.polygons_to_rle(ann["segmentation"], height, width)["counts"]
+        runs = seg_codec._rle_counts(counts)
+        assert sum(runs) == height * width
+        assert seg_codec._rle_string(runs) == counts
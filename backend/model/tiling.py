@@ -0,0 +1,251 @@
+import math
+import numpy as np
+import cv2
+import rasterio
+from rasterio.windows import Window
+from rasterio.errors import RasterioIOError
+from annotations import make_annotation, build_meta
+from seg_codec import decode_segmentation
+
+TILED_EXTENSIONS = {'tif', 'tiff'}
+
+
+def should_tile(image_path, tile_size):
+    """Return True for GeoTIFFs larger than a single inference tile."""
+    if image_path.rsplit('.', 1)[-1].lower() not in TILED_EXTENSIONS:
+        return False
+    try:
+        with rasterio.open(image_path) as dataset:
+            return max(dataset.width, dataset.height) > tile_size
+    except RasterioIOError:
+        return False
+
+
+def _starts(length, tile_size, stride):
+    """Tile offsets along one axis; the last tile is shifted back to stay full size."""
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size + 1, stride))
+    if starts[-1] + tile_size < length:
+        starts.append(length - tile_size)
+    return starts
+
+
+def iter_windows(width, height, tile_size, overlap):
+    """Yield overlapping rasterio windows covering the whole raster."""
+    stride = max(1, tile_size - overlap)
+    for row in _starts(height, tile_size, stride):
+        for col in _starts(width, tile_size, stride):
+            yield Window(col, row, min(tile_size, width - col), min(tile_size, height - row))
+
+
+def _bands(dataset):
+    return [1, 2, 3] if dataset.count >= 3 else [1]
+
+
+def _value_range(dataset, bands, sample_side=1024):
+    """Estimate a stretch range for non-8-bit rasters from a decimated read."""
+    if dataset.dtypes[0] == 'uint8':
+        return None
+    factor = max(1, math.ceil(max(dataset.width, dataset.height) / sample_side))
+    sample = dataset.read(
+        bands,
+        out_shape=(len(bands), max(1, dataset.height // factor), max(1, dataset.width // factor))
+    )
+    lo, hi = np.percentile(sample, (1, 99))
+    return float(lo), float(max(hi, lo + 1))
+
+
+def _to_bgr8(data, value_range):
+    """Convert a (bands, rows, cols) array to a contiguous HxWx3 uint8 BGR image."""
+    if value_range is not None:
+        lo, hi = value_range
+        data = np.clip((data.astype(np.float32) - lo) * (255.0 / (hi - lo)), 0, 255)
+    data = data.astype(np.uint8)
+    img = np.transpose(data, (1, 2, 0))
+    if img.shape[2] == 1:
+        img = np.repeat(img, 3, axis=2)
+    return np.ascontiguousarray(img[:, :, ::-1])
+
+
+def _tile_detections(r, col_off, row_off):
+    """Shift one tile's detections into full-raster pixel coordinates."""
+    boxes = r.boxes.xyxy.cpu().numpy()
+    scores = r.boxes.conf.cpu().numpy()
+    class_ids = r.boxes.cls.cpu().numpy()
+    segs = r.masks.xy if (hasattr(r, "masks") and r.masks is not None) else []
+    shift = np.array([col_off, row_off, col_off, row_off], dtype=np.float32)
+
+    detections = []
+    for idx, (box, score, cid) in enumerate(zip(boxes, scores, class_ids)):
+        polys = []
+        if idx < len(segs) and len(segs[idx]) >= 3:
+            polys.append(segs[idx] + shift[:2])
+        detections.append({
+            "box": box + shift,
+            "score": float(score),
+            "cid": int(cid),
+            "polys": polys
+        })
+    return detections
+
+
+def _union_polygons(polys, box):
+    """Rasterise polygons inside their union box and trace the merged outline."""
+    x0, y0 = int(math.floor(box[0])), int(math.floor(box[1]))
+    w = int(math.ceil(box[2])) - x0 + 1
+    h = int(math.ceil(box[3])) - y0 + 1
+    mask = np.zeros((h, w), dtype=np.uint8)
+    for poly in polys:
+        pts = np.round(poly - [x0, y0]).astype(np.int32).reshape(-1, 1, 2)
+        cv2.fillPoly(mask, [pts], 1)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [c.reshape(-1, 2).astype(np.float32) + [x0, y0] for c in contours if len(c) >= 3]
+
+
+def _box_area(box):
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+
+
+def merge_detections(detections, iou_thresh=0.45, overlap_thresh=0.5):
+    """Cross-tile NMS that unions same-class detections split by tile seams.
+
+    Two detections of the same class are merged when their boxes overlap by
+    ``iou_thresh`` IoU, or when the intersection covers ``overlap_thresh`` of
+    the smaller box (an object cut by a seam). Merged detections keep the
+    best score, the union box and the union of their masks.
+    """
+    kept_by_class = {}
+    for det in sorted(detections, key=lambda d: d["score"], reverse=True):
+        kept = kept_by_class.setdefault(det["cid"], [])
+        for k in kept:
+            ix = min(k["box"][2], det["box"][2]) - max(k["box"][0], det["box"][0])
+            iy = min(k["box"][3], det["box"][3]) - max(k["box"][1], det["box"][1])
+            if ix <= 0 or iy <= 0:
+                continue
+            inter = ix * iy
+            area_k, area_d = _box_area(k["box"]), _box_area(det["box"])
+            iou = inter / (area_k + area_d - inter)
+            if iou < iou_thresh and inter / max(min(area_k, area_d), 1e-6) < overlap_thresh:
+                continue
+
+            k["box"] = np.array([
+                min(k["box"][0], det["box"][0]),
+                min(k["box"][1], det["box"][1]),
+                max(k["box"][2], det["box"][2]),
+                max(k["box"][3], det["box"][3])
+            ], dtype=np.float32)
+            if det["polys"]:
+                k["polys"] = _union_polygons(k["polys"] + det["polys"], k["box"])
+            break
+        else:
+            kept.append(det)
+
+    merged = [d for kept in kept_by_class.values() for d in kept]
+    merged.sort(key=lambda d: d["score"], reverse=True)
+    return merged
+
+
+def _run_tiles(engine, pending, key=None):
+    results = engine.predict_many([tile for _, tile in pending], key=key)
+    detections = []
+    for (window, _), r in zip(pending, results):
+        detections.extend(_tile_detections(r, window.col_off, window.row_off))
+    return detections
+
+
+def render_overview(dataset, bands, value_range, detections, names, max_side=4096, alpha=0.3):
+    """Draw merged detections on a decimated read of the raster."""
+    factor = max(1, math.ceil(max(dataset.width, dataset.height) / max_side))
+    out_h = max(1, dataset.height // factor)
+    out_w = max(1, dataset.width // factor)
+    img = _to_bgr8(dataset.read(bands, out_shape=(len(bands), out_h, out_w)), value_range)
+    overlay = img.copy()
+    sx, sy = out_w / dataset.width, out_h / dataset.height
+
+    for det in detections:
+        for poly in det["polys"]:
+            pts = np.round(poly * [sx, sy]).astype(np.int32).reshape(-1, 1, 2)
+            cv2.fillPoly(overlay, [pts], color=(0, 0, 255))
+        x1, y1, x2, y2 = det["box"]
+        p1 = (int(x1 * sx), int(y1 * sy))
+        cv2.rectangle(img, p1, (int(x2 * sx), int(y2 * sy)), (0, 255, 0), 2)
+        cv2.putText(img, f'{names[det["cid"]]} {det["score"]:.2f}', (p1[0], p1[1] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2, cv2.LINE_AA)
+
+    cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
+    return img
+
+
+def render_annotations_overview(image_path, annotations, max_side=4096):
+    """Overview of a large raster with stored annotations drawn on it, from a decimated read.
+
+    Lets annotated images of tiled rasters be rendered later without ever
+    decoding the full-resolution raster.
+    """
+    names = {ann["category_id"]: ann["class"] for ann in annotations}
+    detections = [
+        {
+            "box": ann["box"],
+            "score": ann["score"],
+            "cid": ann["category_id"],
+            "polys": [np.asarray(poly, dtype=np.float32).reshape(-1, 2)
+                      for poly in decode_segmentation(ann.get("segmentation")) if len(poly) >= 6]
+        }
+        for ann in annotations
+    ]
+    with rasterio.open(image_path) as dataset:
+        bands = _bands(dataset)
+        return render_overview(dataset, bands, _value_range(dataset, bands), detections, names, max_side=max_side)
+
+
+def tiled_predict(image_path, engine, tile_size=1024, overlap=128, batch_tiles=4, iou_thresh=0.45, key=None,
+                  render=True):
+    """Run windowed inference over a large GeoTIFF.
+
+    Tiles are read with rasterio windowed reads and sent to the engine
+    ``batch_tiles`` at a time, so only one batch of pixels plus the
+    detections found so far are held in memory. The dataset is opened once
+    and its transform georeferences the merged detections.
+
+    Returns the annotations meta dict and a BGR overview image with the
+    detections drawn on it, or None for the image when ``render`` is false.
+    """
+    with rasterio.open(image_path) as dataset:
+        transform = dataset.transform
+        scaling_factor = transform.a
+        bands = _bands(dataset)
+        value_range = _value_range(dataset, bands)
+
+        detections = []
+        pending = []
+        for window in iter_windows(dataset.width, dataset.height, tile_size, overlap):
+            tile = _to_bgr8(dataset.read(bands, window=window), value_range)
+            if not tile.any():
+                # Skip nodata-only tiles
+                continue
+            pending.append((window, tile))
+            if len(pending) >= batch_tiles:
+                detections.extend(_run_tiles(engine, pending, key))
+                pending = []
+        if pending:
+            detections.extend(_run_tiles(engine, pending, key))
+
+        merged = merge_detections(detections, iou_thresh=iou_thresh)
+        annotations = [
+            make_annotation(
+                idx,
+                [float(x) for x in det["box"]],
+                det["score"],
+                det["cid"],
+                [poly.flatten().tolist() for poly in det["polys"]],
+                engine.names,
+                transform,
+                scaling_factor
+            )
+            for idx, det in enumerate(merged)
+        ]
+        meta = build_meta(image_path, dataset.width, dataset.height, engine.names, annotations, scaling_factor)
+        annotated = render_overview(dataset, bands, value_range, merged, engine.names) if render else None
+
+    return meta, annotated
@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 # visualize_from_json.py
+#
+# Single image (USER CONFIG below), shown with matplotlib:
+#   python visualize_from_json.py [--headless]
+# Batch re-render of every *_annotations.json under the given files/directories,
+# skipping outputs that are newer than both their JSON and their source image:
+#   python visualize_from_json.py outputs/ --images images --workers 8 [--force]
 
-import os, sys, json, cv2, numpy as np, matplotlib.pyplot as plt
+import os, sys, json, time, argparse, cv2
+from concurrent.futures import ProcessPoolExecutor
+from overlay_renderer import render_overlay, save_image
 
 # ─── USER CONFIG ────────────────────────────────────────────────────────────
 IMAGE_FILE = "1899.png"
@@ -9,62 +17,132 @@ IMAGES_DIR = "images"
 INPUT_JSON = "outputs/1899_annotations.json"
 OUTPUT_DIR = "outputs"
 ALPHA      = 0.3   # opacity of the red fill
+SUFFIX     = "_annotations.json"
 # ────────────────────────────────────────────────────────────────────────────
 
-def main():
-    img_path = os.path.join(IMAGES_DIR, IMAGE_FILE)
-    if not os.path.isfile(img_path) or not os.path.isfile(INPUT_JSON):
-        print("❌ Missing image or JSON", file=sys.stderr)
-        sys.exit(1)
 
-    # load image as BGR
+def render_file(img_path, json_path, out_path, alpha=ALPHA):
+    """Decode the image once, draw its annotations and save ``out_path``; returns the image."""
     img_bgr = cv2.imread(img_path)
     if img_bgr is None:
-        print(f"❌ Failed to read {img_path}", file=sys.stderr)
+        raise ValueError(f"Failed to read {img_path}")
+    with open(json_path) as f:
+        data = json.load(f)
+    # render_overlay fills every polygon (any stored encoding) in one pass
+    img_bgr = render_overlay(img_bgr, data["annotations"], alpha)
+    save_image(out_path, img_bgr)
+    return img_bgr
+
+
+def output_name(stem, fmt):
+    return f"{stem}_fromjson_filled.{fmt}"
+
+
+def find_jsons(paths):
+    """Every *_annotations.json under the given files and directories."""
+    found = []
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            found.extend(os.path.join(root, f) for f in files if f.endswith(SUFFIX))
+    return sorted(found)
+
+
+def index_images(directories):
+    """Map image stem -> path, so sources are found without parsing each JSON."""
+    index = {}
+    for directory in directories:
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(('.json', '.gz', '.br')):
+                index.setdefault(os.path.splitext(entry.name)[0], entry.path)
+    return index
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def plan(jsons, images, out_dir, fmt, force=False):
+    """(image, json, output) jobs whose output is missing or older than one of its inputs."""
+    jobs, missing, fresh = [], [], 0
+    for json_path in jsons:
+        stem = os.path.basename(json_path)[:-len(SUFFIX)]
+        img_path = images.get(stem)
+        if img_path is None:
+            missing.append(json_path)
+            continue
+        out_path = os.path.join(out_dir or os.path.dirname(json_path), output_name(stem, fmt))
+        out_mtime = _mtime(out_path)
+        if not force and out_mtime is not None and out_mtime >= max(_mtime(json_path), _mtime(img_path)):
+            fresh += 1
+            continue
+        jobs.append((img_path, json_path, out_path))
+    return jobs, missing, fresh
+
+
+def _init_worker():
+    # One process per core already; keep OpenCV from oversubscribing them
+    cv2.setNumThreads(1)
+
+
+def _render_job(job):
+    img_path, json_path, out_path = job
+    try:
+        render_file(img_path, json_path, out_path)
+        return None
+    except Exception as e:
+        return f"{json_path}: {e}"
+
+
+def run_batch(args):
+    jsons = find_jsons(args.paths)
+    images = index_images(args.images)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    jobs, missing, fresh = plan(jsons, images, args.output, args.format, args.force)
+    for json_path in missing:
+        print(f"⚠️  No source image for {json_path}", file=sys.stderr)
+    print(f"🔍 {len(jsons)} annotation files, {fresh} up to date, {len(jobs)} to render")
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        chunksize = max(1, min(64, len(jobs) // ((args.workers or os.cpu_count() or 1) * 4)))
+        for error in pool.map(_render_job, jobs, chunksize=chunksize):
+            if error:
+                failed += 1
+                print(f"❌ {error}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Rendered {len(jobs) - failed} images in {elapsed:.1f}s, {failed} failed")
+    if failed or missing:
         sys.exit(1)
 
-    # load annotations
-    with open(INPUT_JSON) as f:
-        data = json.load(f)
 
-    # we'll blend red fills onto this
-    overlay = img_bgr.copy()
-
-    for ann in data["annotations"]:
-        # fill each polygon
-        for poly in ann["segmentation"]:
-            pts = np.array(poly, dtype=np.int32).reshape(-1, 2)
-            cv2.fillPoly(overlay, [pts], color=(0, 0, 255))
-
-        # draw the bounding box on the original for clarity
-        x1, y1, x2, y2 = map(int, ann["box"])
-        cv2.rectangle(img_bgr, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-        # draw label above box
-        label = f'{ann["class"]} {ann["score"]:.2f}'
-        cv2.putText(
-            img_bgr,
-            label,
-            (x1, y1 - 10),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.6,
-            (255, 255, 0),
-            2,
-            cv2.LINE_AA
-        )
-
-    # blend the translucent fill onto the original image
-    cv2.addWeighted(overlay, ALPHA, img_bgr, 1 - ALPHA, 0, img_bgr)
-
-    # save & display
+def run_single(args):
+    img_path = os.path.join(IMAGES_DIR, IMAGE_FILE)
+    if not os.path.isfile(img_path) or not os.path.isfile(INPUT_JSON):
+        print("❌ Missing image or JSON", file=sys.stderr)
+        sys.exit(1)
+
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     base, _ = os.path.splitext(IMAGE_FILE)
-    out_name = f"{base}_fromjson_filled.png"
-    out_path = os.path.join(OUTPUT_DIR, out_name)
-    cv2.imwrite(out_path, img_bgr)
+    out_path = os.path.join(OUTPUT_DIR, output_name(base, args.format))
+    try:
+        img_bgr = render_file(img_path, INPUT_JSON, out_path)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
     print(f"✅ Visualization saved to: {out_path}")
+    if args.headless:
+        return
 
-    # show in matplotlib
+    # show in matplotlib (imported here so headless runs never load it)
+    import matplotlib.pyplot as plt
     img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
     plt.figure(figsize=(8, 8))
     plt.imshow(img_rgb)
@@ -72,5 +150,23 @@ def main():
     plt.title("Filled Segments from JSON")
     plt.show()
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw _annotations.json sidecars onto their images.")
+    parser.add_argument('paths', nargs='*', help="annotation files or directories (batch mode)")
+    parser.add_argument('--images', nargs='+', default=[IMAGES_DIR], help="directories holding the source images")
+    parser.add_argument('-o', '--output', help="output directory (default: next to each JSON)")
+    parser.add_argument('--format', default='png', choices=('png', 'jpg', 'webp'), help="output image format")
+    parser.add_argument('--workers', type=int, help="render processes (default: one per core)")
+    parser.add_argument('--force', action='store_true', help="re-render outputs that are up to date")
+    parser.add_argument('--headless', action='store_true', help="single mode: save without showing")
+    args = parser.parse_args()
+
+    if args.paths:
+        run_batch(args)
+    else:
+        run_single(args)
+
+
 if __name__ == "__main__":
     main()
@@ -225,6 +225,15 @@ export const AppContextProvider = ({ children }: { children: ReactNode }) => {
     setHistory((prev) => [historyItem, ...prev]);
   };
 
+  const waitForJob = async (jobId: string): Promise<string> => {
+    for (;;) {
+      const { data: job } = await api.get(`/jobs/${jobId}`);
+      if (job.status === 'done') return job.result.image_id;
+      if (job.status === 'failed') throw new Error(job.error || 'Processing failed');
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const processFiles = async (files: File[]) => {
     if (files.length === 0) return;
 
@@ -250,9 +259,13 @@ export const AppContextProvider = ({ children }: { children: ReactNode }) => {
           },
         });
 
-        const { image_id } = uploadResponse.data;
+        // Processing runs in a background job; wait for it to produce the image
+        let { image_id } = uploadResponse.data;
+        if (uploadResponse.status === 202) {
+          image_id = await waitForJob(uploadResponse.data.job_id);
+        }
 
-        const imageDetailsResponse = await api.get(`/images/${image_id}`);
+        const imageDetailsResponse = await api.get(`/images/${image_id}?segmentation=polygon`);
         const imageDetails = imageDetailsResponse.data;
 
         const detectionConfidences = imageDetails.detections.map((d: Detection) => d.confidence);
@@ -325,7 +338,7 @@ export const AppContextProvider = ({ children }: { children: ReactNode }) => {
         const response = await api.get('/images');
         const historyItems = await Promise.all(
           response.data.map(async (item: any): Promise<HistoryItem> => {
-            const imageDetailsResponse = await api.get(`/images/${item.id}`);
+            const imageDetailsResponse = await api.get(`/images/${item.id}?segmentation=polygon`);
             const imageDetails = imageDetailsResponse.data;
 
             const detectionConfidences = imageDetails.detections.map((d: Detection) => d.confidence);
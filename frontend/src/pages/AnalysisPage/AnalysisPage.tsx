@@ -42,7 +42,7 @@ const AnalysisPage = () => {
       setError(null);
 
       try {
-        const response = await axios.get(`http://localhost:5000/images/${id}`, {
+        const response = await axios.get(`http://localhost:5000/images/${id}?segmentation=polygon`, {
           withCredentials: true, // Keep withCredentials for CORS
         });
         const imageDetails = response.data;
@@ -106,7 +106,7 @@ const RealTimePage = () => {
                         if (!entry) return null;
 
                         const det = await axios.get(
-                            `http://localhost:5000/realtime-images/${entry.id}`,
+                            `http://localhost:5000/realtime-images/${entry.id}?segmentation=polygon`,
                             { withCredentials: true }
                         );
                         const data = det.data;
@@ -167,7 +167,7 @@ const RealTimePage = () => {
             );
             if (!entry) throw new Error('not found');
 
-            const res = await axios.get(`http://localhost:5000/realtime-images/${entry.id}`, {
+            const res = await axios.get(`http://localhost:5000/realtime-images/${entry.id}?segmentation=polygon`, {
                 withCredentials: true,
             });
             const data = res.data;
@@ -274,7 +274,7 @@ const RealTimePage = () => {
     const downloadJson = async () => {
         if (!selectedImage) return;
         try {
-            const response = await axios.get(`http://localhost:5000/realtime-images/${selectedImage.id}`, {
+            const response = await axios.get(`http://localhost:5000/realtime-images/${selectedImage.id}?segmentation=polygon`, {
                 withCredentials: true,
             });
             const jsonUrl = response.data.annotations_url;